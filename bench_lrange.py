@@ -0,0 +1,225 @@
+"""Benchmark `lrange.lrange` against builtin `range`/`xrange`.
+
+Usage:
+
+    $ python bench_lrange.py [--json results.json] [--baseline old.json]
+
+For each operation and size class, it reports operations per second
+(the best of ``--repeat`` passes) for `lrange` and for the native
+range type (when the native type can handle the size at all) and peak
+memory allocated by a single call (Python 3.4+, measured with
+`tracemalloc`).
+
+With ``--baseline`` the `lrange` numbers are compared with a file saved
+earlier by ``--json``; the exit status is 1 if any operation is slower
+than the baseline by more than ``--threshold``.
+"""
+import json
+import optparse
+import pickle
+import sys
+import timeit
+
+try: xrange
+except NameError:
+    xrange = range # Python 3.x
+
+try:
+    import tracemalloc
+except ImportError: # Python < 3.4
+    tracemalloc = None
+
+from lrange import lrange
+
+if hasattr(sys, "maxint"):
+    MAXINT = sys.maxint
+else:
+    MAXINT = sys.maxsize # Python 3.x
+
+WINDOW = 1000
+
+# size class -> (start, stop) of a `WINDOW`-items range
+SIZES = [
+    ('small', (0, WINDOW)),
+    ('maxint', (MAXINT - WINDOW // 2, MAXINT + WINDOW // 2)),
+    ('huge', (10**200, 10**200 + WINDOW)),
+    ]
+
+
+def _operations(cls, start, stop):
+    """Return list of `(name, func)` benchmarks for range type `cls`."""
+    r = cls(start, stop)
+    middle = start + WINDOW // 2
+    ops = [
+        ('construct', lambda: cls(start, stop)),
+        ('len', lambda: len(r)),
+        ('getitem', lambda: r[WINDOW // 2]),
+        ('getitem_negative', lambda: r[-1]),
+        ('contains', lambda: middle in r),
+        ('contains_miss', lambda: stop in r),
+        ('iter', lambda: list(iter(r))),
+        ('reversed', lambda: list(reversed(r))),
+        ('pickle', lambda: pickle.loads(pickle.dumps(r, 2))),
+        ]
+    if cls is lrange:
+        ops += [
+            ('length', lambda: r.length),
+            ('iter_fallback', lambda: list(r.iterator())),
+            ]
+    return ops
+
+
+def _batch(func, number):
+    """Return seconds that `number` calls of `func()` take."""
+    t0 = timeit.default_timer()
+    for _ in xrange(number):
+        func()
+    return timeit.default_timer() - t0
+
+
+def _calibrate(func, min_time):
+    """Return `(number, seconds)` for a batch of calls of `func()` that
+    takes at least `min_time`."""
+    number = 1
+    while True:
+        elapsed = _batch(func, number)
+        if elapsed >= min_time:
+            return number, elapsed
+        number *= 10
+
+
+def _peak_memory(func):
+    """Return peak number of bytes allocated by `func()` or None."""
+    if tracemalloc is None:
+        return None
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def run(ops=None, sizes=None, min_time=0.1, repeat=5):
+    """Return list of benchmark records (dicts).
+
+    Each benchmark is timed once per pass over all of them and the best
+    of `repeat` passes counts, so that a slow spell of the machine does
+    not hit all batches of one benchmark.
+    """
+    records, funcs = [], []
+    for size, (start, stop) in SIZES:
+        if sizes and size not in sizes:
+            continue
+        for impl, cls in [('lrange', lrange), ('native', xrange)]:
+            try:
+                benchmarks = _operations(cls, start, stop)
+            except OverflowError: # e.g., xrange() on Python 2.x
+                continue
+            for name, func in benchmarks:
+                if ops and name not in ops:
+                    continue
+                try:
+                    func()
+                except OverflowError:
+                    continue
+                number, elapsed = _calibrate(func, min_time)
+                records.append(dict(op=name, size=size, impl=impl,
+                                    ops_per_sec=number / elapsed,
+                                    peak_bytes=_peak_memory(func)))
+                funcs.append((func, number))
+    for _ in xrange(repeat - 1):
+        for rec, (func, number) in zip(records, funcs):
+            rec['ops_per_sec'] = max(rec['ops_per_sec'],
+                                     number / _batch(func, number))
+    return records
+
+
+def compare(records, baseline, threshold):
+    """Return list of `(record, old_ops_per_sec)` that regressed."""
+    old = {}
+    for rec in baseline:
+        old[rec['op'], rec['size'], rec['impl']] = rec['ops_per_sec']
+    regressions = []
+    for rec in records:
+        key = rec['op'], rec['size'], rec['impl']
+        if rec['impl'] != 'lrange' or key not in old:
+            continue
+        if rec['ops_per_sec'] < old[key] * (1 - threshold):
+            regressions.append((rec, old[key]))
+    return regressions
+
+
+def report(records, out=sys.stdout):
+    native = {}
+    for rec in records:
+        if rec['impl'] == 'native':
+            native[rec['op'], rec['size']] = rec['ops_per_sec']
+    out.write("%-18s %-7s %14s %14s %8s %12s\n" % (
+        "operation", "size", "lrange ops/s", "native ops/s", "ratio",
+        "peak bytes"))
+    for rec in records:
+        if rec['impl'] != 'lrange':
+            continue
+        nat = native.get((rec['op'], rec['size']))
+        if nat:
+            nat_s, ratio_s = "%14.0f" % nat, "%8.2f" % (rec['ops_per_sec'] / nat)
+        else:
+            nat_s, ratio_s = "%14s" % "-", "%8s" % "-"
+        out.write("%-18s %-7s %14.0f %s %s %12s\n" % (
+            rec['op'], rec['size'], rec['ops_per_sec'], nat_s, ratio_s,
+            rec['peak_bytes']))
+
+
+def main(argv=None):
+    parser = optparse.OptionParser(usage="%prog [options]")
+    parser.add_option("--json", metavar="FILE",
+                      help="save results as JSON to FILE ('-' for stdout)")
+    parser.add_option("--baseline", metavar="FILE",
+                      help="compare with results saved earlier by --json")
+    parser.add_option("--threshold", type="float", default=0.2,
+                      help="allowed slowdown vs baseline [%default]")
+    parser.add_option("--min-time", type="float", default=0.1,
+                      help="seconds to run each batch [%default]")
+    parser.add_option("--repeat", type="int", default=5,
+                      help="passes over the benchmarks, the best counts"
+                           " [%default]")
+    parser.add_option("--ops", help="comma-separated operations to run")
+    parser.add_option("--sizes", help="comma-separated size classes: %s" % (
+        ",".join([size for size, _ in SIZES]),))
+    options, args = parser.parse_args(argv)
+    if args:
+        parser.error("unexpected arguments: %s" % (args,))
+
+    records = run(ops=options.ops and options.ops.split(','),
+                  sizes=options.sizes and options.sizes.split(','),
+                  min_time=options.min_time, repeat=options.repeat)
+    if options.json == '-':
+        json.dump(records, sys.stdout, indent=1)
+        sys.stdout.write("\n")
+    else:
+        report(records)
+        if options.json:
+            f = open(options.json, 'w')
+            try:
+                json.dump(records, f, indent=1)
+            finally:
+                f.close()
+
+    if options.baseline:
+        f = open(options.baseline)
+        try:
+            baseline = json.load(f)
+        finally:
+            f.close()
+        regressions = compare(records, baseline, options.threshold)
+        for rec, old in regressions:
+            sys.stderr.write("REGRESSION %s/%s: %.0f ops/s (baseline %.0f)\n" % (
+                rec['op'], rec['size'], rec['ops_per_sec'], old))
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -24,6 +24,8 @@ True
 True
 """
 
+import sys as _sys
+
 try: long
 except NameError:
     long = int # Python 3.x
@@ -32,6 +34,12 @@ try: xrange
 except NameError:
     xrange = range # Python 3.x
 
+if _sys.version_info[0] >= 3:
+    # bigints, O(1) `in`, slicing: lrange delegates to it where it can
+    _native_range = range
+else:
+    _native_range = None # `xrange` is limited to C longs
+
 try: any
 except NameError: # pragma: no cover
     def any(iterable): # for Python 2.4
@@ -40,12 +48,140 @@ except NameError: # pragma: no cover
                 return True
         return False
 
-import sys as _sys
+try:
+    from itertools import izip as _zip
+except ImportError:
+    _zip = zip # Python 3.x
+
+import bisect as _bisect
+from collections import deque as _deque
+import hashlib as _hashlib
+import mmap as _mmap
+import numbers as _numbers
+import operator as _operator
+import os as _os
+import pickle as _pickle
+import random as _random
+import struct as _struct
+import threading as _threading
+import time as _time
+from decimal import Decimal as _Decimal
+from fractions import Fraction as _Fraction
 if hasattr(_sys, "maxint"):
     _MAXINT = _sys.maxint
 else:
     _MAXINT = _sys.maxsize # Python 3.x
 
+try:
+    _StopAsyncIteration = StopAsyncIteration
+except NameError: # Python < 3.5
+    _StopAsyncIteration = StopIteration
+
+_clock = getattr(_time, 'perf_counter', _time.time)
+
+try:
+    from statistics import StatisticsError as _StatisticsError
+except ImportError: # Python < 3.4
+    _StatisticsError = ValueError
+
+
+try:
+    _buffer = buffer
+except NameError: # Python 3.x
+    def _buffer(ob):
+        m = memoryview(ob)
+        if m.ndim != 1 or m.itemsize != 1:
+            m = m.cast('B')
+        return m
+
+# fixed-width integer types supported by lrange.to_file() & co
+_INT_CODES = dict(int8='b', uint8='B', int16='h', uint16='H',
+                  int32='i', uint32='I', int64='q', uint64='Q')
+_BYTEORDERS = {None: '=', 'little': '<', 'big': '>'}
+
+
+def _int_format(dtype, byteorder):
+    """Return `struct` format for a single item of `dtype` and `byteorder`.
+
+    `dtype` is a name such as 'int32' or the corresponding NumPy type;
+    `byteorder` is 'little', 'big' or None (native).
+    """
+    name = dtype
+    if not isinstance(name, str):
+        name = getattr(dtype, 'name', None) or getattr(dtype, '__name__', None)
+    try:
+        code = _INT_CODES[name]
+    except KeyError:
+        raise TypeError("unsupported dtype: %r" % (dtype,))
+    try:
+        return _BYTEORDERS[byteorder] + code
+    except KeyError:
+        raise ValueError("byteorder must be 'little', 'big' or None, got %r"
+                         % (byteorder,))
+
+
+class _Stats(object):
+    """Counters of lrange calls, see `lrange.enable_stats()`."""
+
+    def __init__(self):
+        self.callback = None
+        self.counts = {} # (op, path) -> [calls, seconds]
+        self.lock = _threading.Lock()
+        self.local = _threading.local() # .path: slow path of current call
+
+    def record(self, op, path, elapsed):
+        self.lock.acquire()
+        try:
+            c = self.counts.get((op, path))
+            if c is None:
+                c = self.counts[op, path] = [0, 0.0]
+            c[0] += 1
+            c[1] += elapsed
+        finally:
+            self.lock.release()
+        callback = self.callback
+        if callback is not None:
+            callback(op, path, elapsed)
+
+    def wrap(self, op, func):
+        """Return `func` that records its calls as `op`."""
+        local = self.local
+        def wrapper(*args, **kwargs):
+            saved = getattr(local, 'path', None)
+            local.path = None
+            t0 = _clock()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                elapsed = _clock() - t0
+                path = local.path or 'fast'
+                local.path = saved
+                self.record(op, path, elapsed)
+        wrapper.__name__ = func.__name__
+        wrapper.__doc__ = func.__doc__
+        wrapper.__wrapped__ = func
+        return wrapper
+
+_STATS = _Stats()
+_stats = None # _STATS while instrumentation is enabled
+
+# instrumented lrange methods -> operation name
+_INSTRUMENTED = {'__len__': 'len', '__contains__': 'contains',
+                 '__iter__': 'iter', '__getitem__': 'getitem',
+                 'index': 'index', 'count': 'count'}
+
+
+def _note(path):
+    """Mark that the current lrange call took the slow `path`."""
+    if _stats is not None:
+        _stats.local.path = path
+
+
+def _import_numpy():
+    """Return `numpy` module. NumPy is an optional dependency."""
+    import numpy
+    return numpy
+
 
 def _toindex(arg):
     """Convert `arg` to integer type that could be used as an index.
@@ -54,11 +190,160 @@ def _toindex(arg):
     for cls in (int, long):
         if isinstance(arg, cls): # allow int subclasses
            return int(arg)
-
+    try:
+        return int(_operator.index(arg)) # e.g., NumPy integers
+    except TypeError:
+        pass
     raise TypeError("'%s' object cannot be interpreted as an integer" % (
         type(arg).__name__,))
 
 
+def _length(start, stop, step):
+    """Return number of items in lrange(start, stop, step)."""
+    if step > 0:
+        lo, hi = start, stop
+    else:
+        hi, lo = start, stop
+        step = -step
+        assert step
+
+    if lo >= hi:
+        return 0
+    else:
+        return (hi - lo - 1) // step + 1
+
+
+def _exact(q):
+    """Return `Fraction` `q` as int if it is integral."""
+    if q.denominator == 1:
+        return q.numerator
+    return q
+
+
+def _asarray(np, values):
+    """Return `values` as a NumPy array without losing integer precision.
+
+    NumPy converts e.g. ``[-1, 2**63]`` to float64; an array of Python
+    objects is returned for such integers instead.
+    """
+    a = np.asarray(values)
+    if a.dtype.kind == 'f' and not isinstance(values, np.ndarray):
+        objects = np.array(values, dtype=object)
+        if any([isinstance(x, _numbers.Integral) for x in objects.flat]):
+            return objects
+    return a
+
+
+def _affine_array(np, index, start, step, lo, hi):
+    """Return NumPy array ``start + index * step``.
+
+    `index` is an array of non-negative integers; `lo`, `hi` are the
+    smallest and the largest result. The result is int64 or uint64 if it
+    fits and an array of Python integers (dtype=object) otherwise.
+    """
+    def fits(dt):
+        info = np.iinfo(dt)
+        return info.min <= lo and hi <= info.max
+
+    if fits(np.int64) or fits(np.uint64):
+        # vectorized; uint64 arithmetic wraps around modulo 2**64 so the
+        # result is exact whenever it fits
+        a = index.astype(np.uint64)
+        a *= np.uint64(step % 2**64)
+        a += np.uint64(start % 2**64)
+        if fits(np.int64):
+            a = a.view(np.int64)
+    else:
+        a = index.astype(object)
+        a *= step
+        a += start
+    return a
+
+
+def _egcd(a, b):
+    """Return `(g, x, y)` such that ``a*x + b*y == g == gcd(a, b)``."""
+    x0, y0, x1, y1 = 1, 0, 0, 1
+    while b:
+        q, a, b = a // b, b, a % b
+        x0, x1 = x1, x0 - q * x1
+        y0, y1 = y1, y0 - q * y1
+    return a, x0, y0
+
+
+_OPAQUE = object()
+
+def _integral(ob, lo=None, hi=None):
+    """Return integer equal to number `ob`.
+
+    Return None if `ob` is a number but not an integral one (nan, 2.5,
+    1+1j) or, if `lo`, `hi` are given, not in [lo, hi]; `_OPAQUE` if
+    lrange doesn't know how to compare `ob`.
+    """
+    if hasattr(type(ob), '__index__'): # int subclasses, numpy integers
+        try:
+            return _operator.index(ob)
+        except TypeError:
+            pass
+    if isinstance(ob, _numbers.Number): # float, Fraction, Decimal, complex
+        if not isinstance(ob, _numbers.Real) and hasattr(ob, 'imag'):
+            if ob.imag != 0:
+                return None
+            ob = ob.real
+        if lo is not None and isinstance(ob, (_numbers.Real, _Decimal)):
+            # compare first: int() of e.g. Decimal('1e1000000') is slow
+            # (only known reals: Python 2 orders arbitrary objects)
+            try:
+                if not lo <= ob <= hi:
+                    return None
+            except (TypeError, ArithmeticError): # e.g., Decimal('NaN')
+                pass
+        try:
+            i = int(ob)
+        except (ValueError, OverflowError): # nan, inf
+            return None
+        except TypeError:
+            return _OPAQUE
+        if i == ob:
+            return i
+        return None
+    return _OPAQUE
+
+
+def _slice_indices(s, length):
+    """Return `(start, stop, step)` for slice `s` applied to `length` items.
+
+    Like `slice.indices()` but works for arbitrary large `length`.
+    """
+    if s.step is None:
+        step = 1
+    else:
+        step = _toindex(s.step)
+        if step == 0:
+            raise ValueError("slice step cannot be zero")
+
+    if step < 0:
+        lower, upper = -1, length - 1
+    else:
+        lower, upper = 0, length
+
+    def adjust(i, default):
+        if i is None:
+            return default
+        i = _toindex(i)
+        if i < 0:
+            i += length
+            if i < lower:
+                i = lower
+        elif i > upper:
+            i = upper
+        return i
+
+    if step < 0:
+        return adjust(s.start, upper), adjust(s.stop, lower), step
+    else:
+        return adjust(s.start, lower), adjust(s.stop, upper), step
+
+
 class lrange(object):
     """lrange([start,] stop[, step]) -> lrange object
 
@@ -92,6 +377,8 @@ class lrange(object):
     True
     """
 
+    __slots__ = ('_start', '_stop', '_step', '_len', '_native')
+
     def __new__(cls, *args):
         nargs = len(args)
         if nargs == 1:
@@ -112,49 +399,112 @@ class lrange(object):
                              " got %s" % (args,))
 
         r = super(lrange, cls).__new__(cls)
+        r._init(start, stop, step)
+        return r
+
+    def _init(self, start, stop, step):
         assert start is not None
         assert stop is not None
         assert step is not None
-        r._start, r._stop, r._step = start, stop, step
-        return r
+        _setattr = object.__setattr__
+        _setattr(self, '_start', start)
+        _setattr(self, '_stop', stop)
+        _setattr(self, '_step', step)
+        _setattr(self, '_len', _length(start, stop, step))
+        if _native_range is None:
+            _setattr(self, '_native', None)
+        # else `_native` is created on first use, see __getattr__()
+
+    def __getattr__(self, name):
+        # only called for the unset `_native` slot: slices, chunks, etc.
+        # that are never indexed don't pay for a native range
+        if name != '_native':
+            raise AttributeError("'%s' object has no attribute %r" % (
+                self.__class__.__name__, name))
+        native = _native_range(self._start, self._stop, self._step)
+        object.__setattr__(self, '_native', native)
+        return native
+
+    def __setstate__(self, state):
+        # pickles of the former unslotted lrange carry its __dict__
+        self._init(state['_start'], state['_stop'], state['_step'])
+
+    def __setattr__(self, name, value):
+        raise AttributeError("readonly attribute")
+
+    def __delattr__(self, name):
+        raise AttributeError("readonly attribute")
 
     def length(self):
         """len(self) might throw OverflowError, this method shouldn't."""
-        if self._step > 0:
-            lo, hi = self._start, self._stop
-            step = self._step
-        else:
-            hi, lo = self._start, self._stop
-            step = -self._step
-            assert step
-
-        if lo >= hi:
-            return 0
-        else:
-            return (hi - lo - 1) // step + 1
+        return self._len
 
     def __len__(self):
-        L = self.length
+        L = self._len
         if L > _MAXINT:
+            _note('overflow')
             raise OverflowError(
                 "cannot fit '%.200s' into an index-sized integer" % type(L).__name__)
         return int(L)
 
     def __bool__(self):
-        return bool(self.length)
+        return bool(self._len)
 
     __nonzero__ = __bool__
 
     length = property(length)
 
     def __getitem__(self, i):
+        native = self._native
+        if native is not None:
+            if type(i) is int:
+                try: return native[i]
+                except IndexError:
+                    raise IndexError("lrange object index out of range")
+            elif type(i) is slice:
+                r = native[i]
+                return lrange(r.start, r.stop, r.step)
+
+        if isinstance(i, slice):
+            start, stop, step = _slice_indices(i, self._len)
+            return lrange(self._start + start * self._step,
+                          self._start + stop * self._step,
+                          step * self._step)
+
+        i = _toindex(i)
         if i < 0:
-            i = i + self.length
-        if i < 0 or i >= self.length:
+            i = i + self._len
+        if i < 0 or i >= self._len:
             raise IndexError("lrange object index out of range")
 
         return self._start + i * self._step
 
+    def _key(self):
+        """Canonical form: lranges that have the same items share it."""
+        if self._len == 0:
+            return (0, None, None)
+        elif self._len == 1:
+            return (1, self._start, None)
+        else:
+            return (self._len, self._start, self._step)
+
+    def __eq__(self, other):
+        if not isinstance(other, lrange):
+            return NotImplemented
+        if self._native is not None and other._native is not None:
+            return self._native == other._native
+        return self is other or self._key() == other._key()
+
+    def __ne__(self, other):
+        if not isinstance(other, lrange):
+            return NotImplemented
+        return not self == other
+
+    def __hash__(self):
+        if self._native is not None:
+            return hash(self._native) # same canonical form as _key()
+        return hash(self._key())
+
     def __repr__(self):
         if self._step == 1:
             return "%s(%r, %r)" % (
@@ -165,9 +515,21 @@ class lrange(object):
                 self.__class__.__name__, self._start, self._stop, self._step)
 
     def __contains__(self, ob):
-        if type(ob) not in (int, long, bool): # mimic py3k
-            # perform iterative search
-            return any(i == ob for i in self)
+        native = self._native
+        if native is not None and type(ob) in (int, bool):
+            return ob in native
+
+        if type(ob) not in (int, long, bool):
+            i = self._as_item(ob)
+            if i is _OPAQUE:
+                # perform iterative search
+                _note('scan')
+                return any(i == ob for i in self)
+            elif i is None:
+                return False
+            ob = i
+            if native is not None:
+                return ob in native
 
         # if long or bool
         if self._step > 0:
@@ -181,23 +543,389 @@ class lrange(object):
         else:
             return ((ob - self._start) % self._step) == 0
 
+    def _as_item(self, ob):
+        """Return `_integral(ob)`; None if `ob` is out of self's bounds."""
+        if self._len:
+            lo, hi, _ = self._ascending()
+        else:
+            lo, hi = 1, 0 # nothing is in between
+        return _integral(ob, lo, hi)
+
+    def index(self, ob, start=0, stop=None):
+        """Return the first index of `ob` in self[start:stop].
+
+        Raise ValueError if `ob` is not present.
+        """
+        if (self._native is not None and start == 0 and stop is None and
+            type(ob) in (int, bool)):
+            try: return self._native.index(ob)
+            except ValueError:
+                raise ValueError("%r is not in lrange" % (ob,))
+
+        start, stop, _ = _slice_indices(slice(start, stop), self._len)
+        i = ob
+        if type(ob) not in (int, long, bool):
+            i = self._as_item(ob)
+        if i is _OPAQUE:
+            # perform iterative search
+            _note('scan')
+            i = start
+            for item in self[start:stop]:
+                if item == ob:
+                    return i
+                i += 1
+        elif i is not None and i in self:
+            i = (i - self._start) // self._step
+            if start <= i < stop:
+                return i
+        raise ValueError("%r is not in lrange" % (ob,))
+
+    def count(self, ob):
+        """Return number of occurrences of `ob`."""
+        if self._native is not None and type(ob) in (int, bool):
+            return self._native.count(ob)
+        if type(ob) not in (int, long, bool) and self._as_item(ob) is _OPAQUE:
+            # perform iterative search
+            _note('scan')
+            return sum(1 for i in self if i == ob)
+        return int(ob in self)
+
     def __iter__(self):
+        if self._native is not None:
+            return iter(self._native)
         try:
             return iter(xrange(self._start, self._stop,
                                self._step)) # use `xrange`'s iterator
         except (NameError, OverflowError):
-            return self._iterator()
+            _note('fallback')
+            return lrange_iterator(self)
+
+    def iterator(self, index=0):
+        """Return seekable, picklable iterator that starts at self[index].
+
+        See `lrange_iterator`.
+        """
+        return lrange_iterator(self, index)
+
+    def aiter(self, batch=None, every=1024, interval=None):
+        """Return asynchronous iterator: ``async for x in r.aiter()``.
+
+        See `lrange_aiterator`.
+        """
+        return lrange_aiterator(self, batch, every, interval)
+
+    def __aiter__(self):
+        return lrange_aiterator(self)
+
+    def sum(self):
+        """Return sum of items (0 if empty)."""
+        n = self._len
+        return n * self._start + self._step * (n * (n - 1) // 2)
 
-    def _iterator(self):
-        len_ = self.length
+    def min(self):
+        """Return the smallest item."""
+        if not self._len:
+            raise ValueError("min() arg is an empty sequence")
+        return self._ascending()[0]
+
+    def max(self):
+        """Return the largest item."""
+        if not self._len:
+            raise ValueError("max() arg is an empty sequence")
+        return self._ascending()[1]
+
+    def mean(self):
+        """Return arithmetic mean as int or `Fraction`."""
+        if not self._len:
+            raise _StatisticsError("mean requires at least one data point")
+        first, last, _ = self._ascending()
+        return _exact(_Fraction(first + last, 2))
+
+    def median(self):
+        """Return median as int or `Fraction`. Same as mean()."""
+        if not self._len:
+            raise _StatisticsError("no median for empty data")
+        return self.mean()
+
+    def pvariance(self):
+        """Return population variance as int or `Fraction`."""
+        n = self._len
+        if not n:
+            raise _StatisticsError("pvariance requires at least one data point")
+        return _exact(_Fraction(self._step**2 * (n*n - 1), 12))
+
+    def variance(self):
+        """Return sample variance as int or `Fraction`."""
+        n = self._len
+        if n < 2:
+            raise _StatisticsError("variance requires at least two data points")
+        return _exact(_Fraction(self._step**2 * n * (n + 1), 12))
+
+    def quantile(self, q):
+        """Return `q`-th quantile, 0 <= q <= 1, as int or `Fraction`.
+
+        Linear interpolation between items i.e., NumPy's default method.
+        """
+        q = _Fraction(q)
+        if not 0 <= q <= 1:
+            raise ValueError("quantile must be in [0, 1], got %s" % (q,))
+        if not self._len:
+            raise _StatisticsError("no quantile for empty data")
+        first, last, step = self._ascending()
+        return _exact(first + q * (self._len - 1) * step)
+
+    def permuted(self, seed=None, index=0):
+        """Return iterator over items in a pseudorandom order.
+
+        The order is a bijection of `seed` (random if None), so it is
+        reproducible; memory is O(1) for any length. See
+        `lrange_permutation`.
+        """
+        return lrange_permutation(self, seed, index)
+
+    def sample(self, k, seed=None):
+        """Return list of `k` distinct items chosen pseudorandomly.
+
+        It is a prefix of `self.permuted(seed)`. O(k) time and memory.
+        """
+        k = _toindex(k)
+        if not 0 <= k <= self._len:
+            raise ValueError("Sample larger than population or is negative")
+        it = self.permuted(seed)
+        return [next(it) for _ in xrange(k)]
+
+    def choice(self, seed=None):
+        """Return a random item."""
+        if not self._len:
+            raise IndexError("Cannot choose from an empty sequence")
+        if seed is None:
+            rng = _random
+        else:
+            rng = _random.Random(seed)
+        return self[rng.randrange(self._len)]
+
+    def where(self, residue, modulus):
+        """Return items ``i`` such that ``i % modulus == residue % modulus``.
+
+        The result is an exact lrange in the direction of self.
+        """
+        residue, modulus = _toindex(residue), _toindex(modulus)
+        if modulus <= 0:
+            raise ValueError("modulus must be positive")
+        if not self._len:
+            return lrange(0)
+        lo, hi = _bounds(self)
+        return self & lrange(lo + (residue - lo) % modulus, hi, modulus)
+
+    def map(self, func):
+        """Return lazy sequence of ``func(i)`` for each item ``i``.
+
+        See `lrange_map`.
+        """
+        return lrange_map(func, self)
+
+    def enumerate(self, start=0):
+        """Return lazy sequence of ``(index + start, item)`` pairs."""
+        start = _toindex(start)
+        return lrange_map(_tuple, lrange(start, start + self._len), self)
+
+    def zip(self, *others):
+        """Return lazy sequence of tuples of items of self and `others` lranges."""
+        return lrange_map(_tuple, self, *others)
+
+    def chunks(self, size, materialize=None):
+        """Generate consecutive blocks of `size` items (the last may be shorter).
+
+        `materialize` selects what is yielded per block:
+
+          - None: `lrange` objects (O(1) each)
+          - 'list': lists of integers
+          - 'numpy': NumPy arrays, see `lrange.to_numpy()`
+        """
+        size = _toindex(size)
+        if size <= 0:
+            raise ValueError("chunk size must be positive")
+        if materialize not in (None, 'list', 'numpy'):
+            raise ValueError("unknown materialize value: %r" % (materialize,))
+        return self._chunks(size, materialize)
+
+    def _chunks(self, size, materialize):
+        start, step, len_ = self._start, self._step, self._len
         i = 0
         while i < len_:
-            yield self._start + i * self._step
-            i += 1
+            n = min(size, len_ - i)
+            if materialize == 'list':
+                first = start + i * step
+                yield [first + j * step for j in xrange(n)]
+            else:
+                r = self._subrange(i, i + n)
+                if materialize == 'numpy':
+                    r = r.to_numpy()
+                yield r
+            i += n
+
+    def _affine(self, first, step):
+        """Return lrange of len(self) items: first, first + step, ..."""
+        return lrange(first, first + self._len * step, step)
+
+    def __add__(self, k):
+        """self + k: lrange with every item shifted by integer `k`."""
+        try: k = _toindex(k)
+        except TypeError:
+            return NotImplemented
+        return lrange(self._start + k, self._stop + k, self._step)
+
+    __radd__ = __add__
+
+    def __sub__(self, k):
+        try: k = _toindex(k)
+        except TypeError:
+            return NotImplemented
+        return self + -k
+
+    def __rsub__(self, k):
+        try: k = _toindex(k)
+        except TypeError:
+            return NotImplemented
+        return -self + k
+
+    def __mul__(self, k):
+        """self * k: lrange with every item multiplied by integer `k` != 0."""
+        try: k = _toindex(k)
+        except TypeError:
+            return NotImplemented
+        if k == 0:
+            raise ValueError("cannot scale lrange by zero")
+        return self._affine(self._start * k, self._step * k)
+
+    __rmul__ = __mul__
 
+    def __neg__(self):
+        return self * -1
+
+    def __floordiv__(self, k):
+        """self // k: lrange of items floor-divided by `k`.
+
+        Only defined when the result is an arithmetic progression i.e.,
+        `k` divides the step; ValueError otherwise.
+        """
+        try: k = _toindex(k)
+        except TypeError:
+            return NotImplemented
+        if k == 0:
+            raise ZeroDivisionError("lrange floor division by zero")
+        if self._len > 1 and self._step % k:
+            raise ValueError("lrange step %r is not divisible by %r" % (
+                self._step, k))
+        if self._len <= 1:
+            return lrange(self._start // k, self._start // k + self._len)
+        return self._affine(self._start // k, self._step // k)
+
+    def _subrange(self, i, j):
+        """Return self[i:j] for 0 <= i <= j <= len(self)."""
+        return lrange(self._start + i * self._step,
+                      self._start + j * self._step, self._step)
+
+    def split(self, k):
+        """Return a list of `k` contiguous lranges that partition self.
+
+        Their lengths differ by at most one; longer pieces come first.
+        """
+        k = _toindex(k)
+        if k <= 0:
+            raise ValueError("number of pieces must be positive")
+        q, r = divmod(self._len, k)
+        pieces = []
+        i = 0
+        for j in xrange(k):
+            n = q + (j < r)
+            pieces.append(self._subrange(i, i + n))
+            i += n
+        return pieces
+
+    def shard(self, i, n):
+        """Return `i`-th of `n` strided shards i.e., self[i::n].
+
+        Shards 0..n-1 together cover every item exactly once.
+        """
+        i, n = _toindex(i), _toindex(n)
+        if n <= 0:
+            raise ValueError("number of shards must be positive")
+        if not 0 <= i < n:
+            raise IndexError("lrange shard index out of range")
+        return self[i::n]
+
+    def _ascending(self):
+        """Return `(first, last, step)` with step > 0 for a non-empty self."""
+        first = self._start
+        last = first + (self._len - 1) * self._step
+        if self._len == 1:
+            return first, last, 1
+        elif self._step > 0:
+            return first, last, self._step
+        else:
+            return last, first, -self._step
+
+    def intersection(self, other):
+        """Return items common to self and `other` as an lrange.
+
+        The result follows the direction of self. O(log(step)) time.
+        """
+        if not isinstance(other, lrange):
+            raise TypeError("intersection() argument must be lrange, not %s"
+                            % (type(other).__name__,))
+        if not (self._len and other._len):
+            return lrange(0)
+        first1, last1, step1 = self._ascending()
+        first2, last2, step2 = other._ascending()
+
+        # solve x = first1 (mod step1), x = first2 (mod step2)
+        g, inv, _ = _egcd(step1, step2)
+        diff = first2 - first1
+        if diff % g:
+            return lrange(0)
+        step = step1 // g * step2
+        x = first1 + step1 * (diff // g * inv % (step2 // g))
+
+        lo, hi = max(first1, first2), min(last1, last2)
+        first = lo + (x - lo) % step
+        if first > hi:
+            return lrange(0)
+        r = lrange(first, hi + 1, step)
+        if self._step < 0:
+            r = reversed(r)
+        return r
+
+    def __and__(self, other):
+        if not isinstance(other, lrange):
+            return NotImplemented
+        return self.intersection(other)
+
+    def issubset(self, other):
+        """Whether every item of self is in `other` lrange."""
+        if not isinstance(other, lrange):
+            raise TypeError("issubset() argument must be lrange, not %s"
+                            % (type(other).__name__,))
+        if not self._len:
+            return True
+        first, last, step = self._ascending()
+        if first not in other or last not in other:
+            return False
+        return self._len == 1 or step % other._step == 0
+
+    def issuperset(self, other):
+        """Whether every item of `other` lrange is in self."""
+        if not isinstance(other, lrange):
+            raise TypeError("issuperset() argument must be lrange, not %s"
+                            % (type(other).__name__,))
+        return other.issubset(self)
+
+    def isdisjoint(self, other):
+        """Whether self and `other` lrange have no items in common."""
+        return not self.intersection(other)
 
     def __reversed__(self):
-        len_ = self.length
+        len_ = self._len
         new_start = self._start + (len_ - 1) * self._step
         new_stop = self._start
         if self._step > 0:
@@ -206,5 +934,1685 @@ class lrange(object):
             new_stop += 1
         return lrange(new_start, new_stop, -self._step)
 
+    def to_numpy(self, dtype=None, offset=False):
+        """Return items as a NumPy array.
+
+        If `dtype` is None then int64 or uint64 is used if the items fit,
+        otherwise an array of Python integers (dtype=object) is returned.
+
+        If `offset` is true then items are stored relative to the first
+        one i.e., ``a[i] == self[i] - self[0]``.
+        """
+        np = _import_numpy()
+        n = len(self)
+        if offset:
+            start = 0
+        else:
+            start = self._start
+        last = start + (n - 1) * self._step
+        lo, hi = min(start, last), max(start, last)
+
+        def fits(dt):
+            info = np.iinfo(dt)
+            return n == 0 or info.min <= lo and hi <= info.max
+
+        if dtype is None:
+            for dtype in (np.int64, np.uint64, object):
+                if dtype is object or fits(dtype):
+                    break
+        dtype = np.dtype(dtype)
+
+        if dtype.kind in 'iu' and not fits(dtype):
+            raise OverflowError("lrange items do not fit into %s" % (dtype,))
+
+        a = _affine_array(np, np.arange(n, dtype=np.uint64), start,
+                          self._step, lo, hi)
+        return a.astype(dtype, copy=False)
+
+    def __array__(self, dtype=None, copy=None):
+        if copy is False: # NumPy 2 protocol: there is no buffer to share
+            raise ValueError("lrange can't be converted to an array"
+                             " without a copy")
+        return self.to_numpy(dtype)
+
+    def _packer(self, fmt):
+        """Return iterator over items packed into bytes chunks by `fmt`.
+
+        Raise OverflowError (eagerly) if the items do not fit.
+        """
+        bits = 8 * _struct.calcsize(fmt)
+        if fmt[-1].islower(): # signed
+            lo, hi = -(1 << bits - 1), (1 << bits - 1) - 1
+        else:
+            lo, hi = 0, (1 << bits) - 1
+        if self._len:
+            first, last = self._start, self._start + (self._len - 1) * self._step
+            if min(first, last) < lo or max(first, last) > hi:
+                raise OverflowError("lrange items do not fit into %d-bit %s"
+                                    " integers" % (bits, fmt[-1].islower() and
+                                                   "signed" or "unsigned"))
+        return self._pack(fmt)
+
+    def _pack(self, fmt):
+        try:
+            np = _import_numpy()
+        except ImportError:
+            np = None
+        else:
+            dtype = np.dtype(fmt[-1]).newbyteorder(fmt[0])
+        for chunk in self._chunks(self._CHUNK, None):
+            if np is not None:
+                yield chunk.to_numpy(dtype).tobytes()
+            else:
+                yield _struct.pack(fmt[0] + '%d' % len(chunk) + fmt[-1],
+                                   *chunk)
+
+    def to_file(self, file, dtype='int64', byteorder=None):
+        """Write items as raw fixed-width integers to `file`.
+
+        `file` is a path or a binary file object. `dtype` is one of
+        'int8', 'uint8', ... 'int64', 'uint64' (or a NumPy equivalent);
+        `byteorder` is 'little', 'big' or None (native). Items are
+        written in chunks so memory use does not grow with the length.
+
+        Raise OverflowError if the items do not fit into `dtype`.
+        """
+        chunks = self._packer(_int_format(dtype, byteorder))
+        if hasattr(file, 'write'):
+            for b in chunks:
+                file.write(b)
+            return
+        f = open(file, 'wb')
+        try:
+            for b in chunks:
+                f.write(b)
+        finally:
+            f.close()
+
+    def to_mmap(self, path, dtype='int64', byteorder=None):
+        """Like `to_file()` but return the file memory-mapped (`mmap.mmap`).
+
+        The file is preallocated and filled chunk by chunk in place.
+        """
+        fmt = _int_format(dtype, byteorder)
+        chunks = self._packer(fmt)
+        if not self._len:
+            raise ValueError("cannot mmap an empty lrange")
+        size = self._len * _struct.calcsize(fmt)
+        if size > _MAXINT:
+            raise OverflowError("lrange of %d bytes is too large to mmap"
+                                % (size,))
+        f = open(path, 'w+b')
+        try:
+            try:
+                if hasattr(_os, 'posix_fallocate'): # Python 3.3+, POSIX
+                    # reserve the blocks: a sparse file that can't be
+                    # filled kills the process with SIGBUS
+                    _os.posix_fallocate(f.fileno(), 0, size)
+                else:
+                    f.truncate(size)
+                mm = _mmap.mmap(f.fileno(), size)
+            finally:
+                f.close()
+        except:
+            _os.remove(path) # don't leave an empty or partial file behind
+            raise
+        offset = 0
+        for b in chunks:
+            mm[offset:offset + len(b)] = b
+            offset += len(b)
+        mm.flush()
+        return mm
+
+    def from_buffer(cls, buf, dtype='int64', byteorder=None):
+        """Return lrange stored in `buf` by `to_file()`/`to_mmap()`.
+
+        `buf` is any object that supports the buffer protocol (bytes,
+        `mmap.mmap`, NumPy array, ...). Raise ValueError if its items are
+        not an arithmetic progression with a nonzero step.
+        """
+        fmt = _int_format(dtype, byteorder)
+        view = _buffer(buf)
+        itemsize = _struct.calcsize(fmt)
+        n, rest = divmod(len(view), itemsize)
+        if rest:
+            raise ValueError("buffer size %d is not a multiple of item size %d"
+                             % (len(view), itemsize))
+        if not n:
+            return cls(0)
+        first = _struct.unpack_from(fmt, view, 0)[0]
+        step = 1
+        if n > 1:
+            step = _struct.unpack_from(fmt, view, itemsize)[0] - first
+        if not step:
+            raise ValueError("buffer items are not an lrange")
+        r = cls(first, first + n * step, step)
+        offset = 0
+        try:
+            for b in r._packer(fmt):
+                if view[offset:offset + len(b)] != b:
+                    raise ValueError("buffer items are not an lrange")
+                offset += len(b)
+        except OverflowError: # the progression leaves the dtype's range
+            raise ValueError("buffer items are not an lrange")
+        return r
+
+    from_buffer = classmethod(from_buffer)
+
+    def _take1(self, i, mode):
+        """Return self[i] where out-of-range `i` is handled per `mode`."""
+        n = self._len
+        i = _toindex(i)
+        if mode == 'wrap':
+            if not n:
+                raise IndexError("cannot take from an empty lrange")
+            i %= n
+        elif mode == 'clip':
+            if not n:
+                raise IndexError("cannot take from an empty lrange")
+            i = min(max(i, 0), n - 1)
+        elif i < 0:
+            i += n
+        if not 0 <= i < n:
+            raise IndexError("lrange object index out of range")
+        return self._start + i * self._step
+
+    def take(self, indices, mode='raise'):
+        """Return items at positions `indices` i.e., ``[self[i] for i in indices]``.
+
+        `mode` handles out-of-range indexes like in `numpy.take()`:
+        'raise' raises IndexError (negative indexes count from the end),
+        'wrap' wraps them around and 'clip' clips them to the bounds.
+
+        `indices` may be a sequence or a NumPy array. If NumPy is
+        installed the items are computed in one vectorized pass and
+        returned as a NumPy array (int64, uint64 or Python integers),
+        otherwise as a list.
+        """
+        if mode not in ('raise', 'wrap', 'clip'):
+            raise ValueError("mode must be 'raise', 'wrap' or 'clip', got %r"
+                             % (mode,))
+        try:
+            np = _import_numpy()
+        except ImportError:
+            return [self._take1(i, mode) for i in indices]
+
+        idx = _asarray(np, indices)
+        n = self._len
+        if not idx.size:
+            return np.zeros(idx.shape, dtype=np.int64)
+        if idx.dtype.kind not in 'iuO':
+            raise TypeError("lrange indices must be integers, not %s" % (
+                idx.dtype,))
+        if idx.dtype.kind == 'O': # e.g., [1, 2.5] or huge ints: check each
+            idx = np.array([_toindex(i) for i in idx.flat],
+                           dtype=object).reshape(idx.shape)
+        if not n:
+            raise IndexError("cannot take from an empty lrange")
+
+        if (idx.dtype.kind in 'iu' and n < 2**62 and
+            (idx.dtype.kind == 'i' or idx.max() < 2**62)):
+            idx = idx.astype(np.int64)
+        else:
+            idx = idx.astype(object) # bigint arithmetic
+        if mode == 'wrap':
+            idx = idx % n
+        elif mode == 'clip':
+            idx = np.minimum(np.maximum(idx, 0), n - 1)
+        else:
+            idx = np.where(idx < 0, idx + n, idx)
+            if ((idx < 0) | (idx >= n)).any():
+                raise IndexError("lrange object index out of range")
+
+        first = self._start + int(idx.min()) * self._step
+        last = self._start + int(idx.max()) * self._step
+        return _affine_array(np, idx, self._start, self._step,
+                             min(first, last), max(first, last))
+
+    _CHUNK = 1 << 16 # items per block on the Python int (slow) path
+
+    def _apply(self, np, values, out, kernel, scalar, bounds):
+        """Fill `out` with `kernel(values)`, see contains_many().
+
+        `kernel` is evaluated in int64 if it can't overflow i.e., if
+        `values` and `bounds` are less than 2**62 in magnitude, otherwise
+        block by block on Python ints; non-integer values go through
+        `scalar(value)` one by one.
+        """
+        values, flat = values.reshape(-1), out.reshape(-1)
+        lim = 2**62
+        if (values.dtype.kind in 'biu' and values.size and
+            -lim < min(bounds) and max(bounds) < lim and
+            -lim < int(values.min()) and int(values.max()) < lim):
+            flat[:] = kernel(values.astype(np.int64))
+            return
+        for i in xrange(0, values.size, self._CHUNK):
+            block = values[i:i + self._CHUNK]
+            if block.dtype.kind in 'biu':
+                flat[i:i + self._CHUNK] = kernel(block.astype(object))
+            else:
+                flat[i:i + self._CHUNK] = [scalar(v) for v in block.tolist()]
+
+    def contains_many(self, values):
+        """Return boolean mask ``[v in self for v in values]``.
+
+        `values` may be a sequence, `array.array` or NumPy array. If
+        NumPy is installed the membership test is vectorized and the
+        result is a NumPy array of the same shape, otherwise a list.
+        """
+        try:
+            np = _import_numpy()
+        except ImportError:
+            return [v in self for v in values]
+        values = _asarray(np, values)
+        out = np.zeros(values.shape, dtype=bool)
+        if not self._len:
+            return out
+        first, last, step = self._ascending()
+
+        def kernel(a):
+            d = a - first
+            return (d >= 0) & (a <= last) & (d % step == 0)
+
+        self._apply(np, values, out, kernel, self.__contains__, (first, last))
+        return out
+
+    def _sorted_params(self):
+        """Return `(start, step, sign)`: sign*self[i] == start + i*step, step > 0."""
+        if self._step > 0:
+            return self._start, self._step, 1
+        return -self._start, -self._step, -1
+
+    def _searchsorted1(self, v, side):
+        start, step, sign = self._sorted_params()
+        if type(v) not in (int, long, bool):
+            i = self._as_item(v)
+            if i is _OPAQUE:
+                raise TypeError("'%s' object is not a number" % (
+                    type(v).__name__,))
+            elif i is None:
+                if v != v:
+                    raise ValueError("cannot search for nan")
+                if not self._len:
+                    return 0
+                lo, hi, _ = self._ascending()
+                if v < lo or v > hi: # e.g., inf
+                    return (v > hi) == (sign > 0) and self._len or 0
+                i = _Fraction(v) # floor division stays exact
+            v = i
+        v = sign * v
+        if side == 'left':
+            k = -((start - v) // step)
+        else:
+            k = (v - start) // step + 1
+        return int(min(max(k, 0), self._len))
+
+    def searchsorted(self, values, side='left'):
+        """Return indexes where `values` would be inserted to keep order.
+
+        Like `numpy.searchsorted(a, values, side)` for ``a = list(self)``
+        when self is ascending; for a descending self the order kept is
+        descending. `values` may be a sequence, `array.array` or NumPy
+        array. If NumPy is installed the computation is vectorized and
+        the result is a NumPy array of the same shape, otherwise a list.
+        """
+        if side not in ('left', 'right'):
+            raise ValueError("side must be 'left' or 'right', got %r" % (
+                side,))
+        scalar = lambda v: self._searchsorted1(v, side)
+        try:
+            np = _import_numpy()
+        except ImportError:
+            return [scalar(v) for v in values]
+        values = _asarray(np, values)
+        n = self._len
+        if n < 2**63:
+            dtype = np.int64
+        else:
+            dtype = object
+        out = np.zeros(values.shape, dtype=dtype)
+        if not n:
+            return out
+        start, step, sign = self._sorted_params()
+
+        def kernel(a):
+            a = a * sign
+            if side == 'left':
+                k = -((start - a) // step)
+            else:
+                k = (a - start) // step + 1
+            return np.minimum(np.maximum(k, 0), n)
+
+        self._apply(np, values, out, kernel, scalar,
+                    (start, start + (n - 1) * step))
+        return out
+
     def __getnewargs__(self):
         return self._start, self._stop, self._step
+
+    def _pieces(self, workers, chunk):
+        """Return (workers, sub-lranges) for the parallel_*() methods."""
+        if workers is None:
+            try:
+                from multiprocessing import cpu_count
+                workers = cpu_count()
+            except NotImplementedError:
+                workers = 1
+        workers = _toindex(workers)
+        if workers <= 0:
+            raise ValueError("number of workers must be positive")
+        if chunk is None:
+            chunk = max(1, min(self._CHUNK, -(-self._len // (4 * workers))))
+        return workers, self.chunks(chunk)
+
+    def parallel_map(self, func, workers=None, chunk=None, ordered=True,
+                     threads=False, max_pending=None):
+        """Generate ``func(x)`` for items `x` computed by a pool of workers.
+
+        `workers` processes (threads if `threads` is true; default: CPU
+        count) get blocks of `chunk` items as (start, stop, step) only,
+        so `func` must be picklable for processes (e.g., a module-level
+        function). Results are yielded in order or, if `ordered` is
+        false, block by block as they complete. At most `max_pending`
+        blocks (default: 2 * workers) are in flight, so memory use does
+        not grow with the length.
+
+        An exception in `func` is re-raised here; no more blocks are
+        submitted after it, nor after the generator is closed early (the
+        blocks in flight are completed first).
+        """
+        workers, pieces = self._pieces(workers, chunk)
+        return _chain_results(_pool_results(_map_range, (func,), pieces,
+                                            workers, ordered, threads,
+                                            max_pending or 2 * workers))
+
+    def parallel_reduce(self, func, combine, initial, workers=None,
+                        chunk=None, threads=False, max_pending=None):
+        """Return ``combine(... combine(initial, a1), ... an)``.
+
+        Each block of items is folded by a worker as ``ai = func(...
+        func(initial, x1), ... xk)``; `initial` should be an identity for
+        `combine` e.g., ``r.parallel_reduce(operator.add, operator.add,
+        0) == r.sum()``. Blocks are combined in order. Other arguments
+        are as in `parallel_map()`.
+        """
+        workers, pieces = self._pieces(workers, chunk)
+        acc = initial
+        for value in _pool_results(_reduce_range, (func, initial), pieces,
+                                   workers, True, threads,
+                                   max_pending or 2 * workers):
+            acc = combine(acc, value)
+        return acc
+
+    def enable_stats(callback=None):
+        """Start counting calls of lrange operations and time spent in them.
+
+        Calls are counted per operation ('len', 'contains', 'iter',
+        'getitem', 'index', 'count') and per path: 'fast' or a slow one
+        i.e., 'scan' (linear search in `in`), 'fallback' (`lrange_iterator`
+        instead of a builtin iterator), 'overflow' (`len()` raised).
+        `callback(op, path, seconds)` is called after each call e.g.,
+        to export metrics. Disabled by default: then lrange methods are
+        not wrapped at all.
+        """
+        global _stats
+        _STATS.callback = callback
+        if _stats is None:
+            for name, op in _INSTRUMENTED.items():
+                setattr(lrange, name, _STATS.wrap(op, lrange.__dict__[name]))
+            _stats = _STATS
+
+    enable_stats = staticmethod(enable_stats)
+
+    def disable_stats():
+        """Stop counting (collected counts are kept)."""
+        global _stats
+        if _stats is not None:
+            for name in _INSTRUMENTED:
+                setattr(lrange, name, lrange.__dict__[name].__wrapped__)
+            _stats = None
+        _STATS.callback = None
+
+    disable_stats = staticmethod(disable_stats)
+
+    def stats():
+        """Return ``{(op, path): (calls, seconds)}``, see `enable_stats()`."""
+        _STATS.lock.acquire()
+        try:
+            return dict((key, tuple(c)) for key, c in _STATS.counts.items())
+        finally:
+            _STATS.lock.release()
+
+    stats = staticmethod(stats)
+
+    def reset_stats():
+        """Clear the counts returned by `stats()`."""
+        _STATS.lock.acquire()
+        try:
+            _STATS.counts.clear()
+        finally:
+            _STATS.lock.release()
+
+    reset_stats = staticmethod(reset_stats)
+
+    def __reduce__(self):
+        return self.__class__, self.__getnewargs__()
+
+
+class lrange_iterator(object):
+    """lrange_iterator(r[, index]) -> iterator over lrange `r` from r[index]
+
+    Unlike `xrange`'s iterator it works for any `r`, supports O(1)
+    `seek()` and can save its position as a string token:
+
+    >>> it = lrange(10**80).iterator(10**60)
+    >>> next(it) == 10**60
+    True
+    >>> token = it.token()
+    >>> next(lrange_iterator.from_token(token)) == 10**60 + 1
+    True
+    """
+
+    __slots__ = ('_range', '_index')
+
+    def __init__(self, r, index=0):
+        if not isinstance(r, lrange):
+            raise TypeError("lrange_iterator() argument must be lrange, not %s"
+                            % (type(r).__name__,))
+        self._range = r
+        self.seek(index)
+
+    def seek(self, index):
+        """Make self[index] the next item; negative `index` counts from end."""
+        len_ = self._range._len
+        index = _toindex(index)
+        if index < 0:
+            index += len_
+        if not 0 <= index <= len_:
+            raise IndexError("lrange_iterator index out of range")
+        self._index = index
+
+    def position(self):
+        """Index of the next item in the underlying lrange."""
+        return self._index
+
+    position = property(position)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        i = self._index
+        r = self._range
+        if i >= r._len:
+            raise StopIteration
+        self._index = i + 1
+        return r._start + i * r._step
+
+    next = __next__ # Python 2.x
+
+    def __length_hint__(self):
+        return self._range._len - self._index
+
+    def __reduce__(self):
+        return self.__class__, (self._range, self._index)
+
+    def token(self):
+        """Return compact string that `from_token()` resumes from."""
+        r = self._range
+        return "%x:%x:%x:%x" % (r._start, r._stop, r._step, self._index)
+
+    def from_token(cls, token):
+        """Return iterator at the position saved by `token()`."""
+        try:
+            start, stop, step, index = [int(s, 16) for s in token.split(':')]
+            return cls(lrange(start, stop, step), index)
+        except (AttributeError, IndexError, ValueError): # e.g., zero step
+            raise ValueError("invalid lrange_iterator token: %r" % (token,))
+
+    from_token = classmethod(from_token)
+
+
+class _Resume(object):
+    """Awaitable that returns `value`, optionally suspending once first.
+
+    A bare suspension (yielding None) makes asyncio reschedule the task
+    i.e., other tasks may run, like ``await asyncio.sleep(0)``.
+    """
+    __slots__ = ('_value', '_suspend')
+
+    def __init__(self, value, suspend):
+        self._value = value
+        self._suspend = suspend
+
+    def __await__(self):
+        return self
+    __iter__ = __await__
+
+    def __next__(self):
+        if self._suspend:
+            self._suspend = False
+            return None
+        raise StopIteration(self._value)
+    next = __next__
+
+
+class lrange_aiterator(object):
+    """Asynchronous iterator over lrange items (or sub-range batches).
+
+    It hands control back to the event loop after every `every` items
+    (batches) and, if `interval` (seconds) is not None, whenever that
+    much time has passed since the task was last resumed. With `batch`
+    it yields consecutive sub-lranges of `batch` items (see
+    `lrange.chunks()`) so a consumer can process them at its own pace.
+
+    >>> import asyncio                                  # doctest: +SKIP
+    >>> async def total(r):                             # doctest: +SKIP
+    ...     return sum([x async for x in r.aiter(every=100)])
+    >>> asyncio.run(total(lrange(10**4)))               # doctest: +SKIP
+    49995000
+    """
+    def __init__(self, r, batch=None, every=1024, interval=None):
+        every = _toindex(every)
+        if every <= 0:
+            raise ValueError("every must be positive")
+        if batch is None:
+            self._it = iter(r)
+        else:
+            self._it = r.chunks(batch)
+        self._every = every
+        self._interval = interval
+        self._count = 0
+        self._deadline = None
+
+    def __aiter__(self):
+        return self
+
+    def __anext__(self):
+        if self._interval is not None and self._deadline is None:
+            self._deadline = _clock() + self._interval
+        try:
+            value = next(self._it)
+        except StopIteration:
+            raise _StopAsyncIteration
+        self._count += 1
+        suspend = self._count >= self._every or (
+            self._deadline is not None and _clock() >= self._deadline)
+        if suspend:
+            self._count = 0
+            self._deadline = None
+        return _Resume(value, suspend)
+
+
+def _tuple(*args):
+    return args
+
+
+class lrange_map(object):
+    """lrange_map(func, r1[, r2, ...]) -> lazy ``map(func, r1, r2, ...)``
+
+    A sequence of ``func(r1[i], r2[i], ...)`` as long as the shortest
+    lrange. Unlike `map()` it supports len(), indexing and slicing in
+    O(1); `func` is called only for the items that are accessed.
+
+    >>> squares = lrange(10**80).map(lambda i: i*i)
+    >>> squares[-1] == (10**80 - 1)**2
+    True
+    >>> list(squares[2:5])
+    [4, 9, 16]
+    """
+
+    __slots__ = ('_func', '_ranges', '_len')
+
+    def __init__(self, func, *ranges):
+        if not ranges:
+            raise TypeError("lrange_map() must have at least one lrange")
+        for r in ranges:
+            if not isinstance(r, lrange):
+                raise TypeError("lrange_map() arguments must be lrange, not %s"
+                                % (type(r).__name__,))
+        self._len = min([r._len for r in ranges])
+        self._func = func
+        self._ranges = tuple([r._subrange(0, self._len) for r in ranges])
+
+    def length(self):
+        """len(self) might throw OverflowError, this method shouldn't."""
+        return self._len
+
+    length = property(length)
+
+    def __len__(self):
+        return len(self._ranges[0])
+
+    def __bool__(self):
+        return bool(self._len)
+
+    __nonzero__ = __bool__
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return self.__class__(self._func, *[r[i] for r in self._ranges])
+        return self._func(*[r[i] for r in self._ranges])
+
+    def __iter__(self):
+        func = self._func
+        for args in _zip(*self._ranges):
+            yield func(*args)
+
+    def __reversed__(self):
+        return self.__class__(self._func,
+                              *[reversed(r) for r in self._ranges])
+
+    def __repr__(self):
+        return "%s(%r, %s)" % (self.__class__.__name__, self._func,
+                               ", ".join(map(repr, self._ranges)))
+
+
+class ndrange(object):
+    """ndrange(r1[, r2, ...]) -> lazy Cartesian product of lranges
+
+    A sequence of coordinate tuples in C order (the last axis varies
+    fastest) like ``itertools.product(r1, r2, ...)``, but with len(),
+    indexing (flat index <-> coordinate) and membership tests in
+    O(ndim) integer arithmetic.
+
+    >>> grid = ndrange(lrange(10**30), lrange(0, 10, 5))
+    >>> grid.length == 2 * 10**30
+    True
+    >>> grid[3] == (1, 5)
+    True
+    >>> grid.index((10**29, 5)) == 2 * 10**29 + 1
+    True
+    >>> list(grid[:3]) == [(0, 0), (0, 5), (1, 0)]
+    True
+    """
+
+    __slots__ = ('_ranges', '_strides', '_len')
+
+    def __init__(self, *ranges):
+        for r in ranges:
+            if not isinstance(r, lrange):
+                raise TypeError("ndrange() arguments must be lrange, not %s"
+                                % (type(r).__name__,))
+        strides = []
+        n = 1
+        for r in reversed(ranges):
+            strides.append(n)
+            n *= r._len
+        strides.reverse()
+        self._ranges = ranges
+        self._strides = tuple(strides)
+        self._len = n
+
+    def ranges(self):
+        """Tuple of per-axis lranges."""
+        return self._ranges
+
+    ranges = property(ranges)
+
+    def shape(self):
+        """Tuple of per-axis lengths."""
+        return tuple([r._len for r in self._ranges])
+
+    shape = property(shape)
+
+    def length(self):
+        """len(self) might throw OverflowError, this method shouldn't."""
+        return self._len
+
+    length = property(length)
+
+    def __len__(self):
+        return len(lrange(self._len))
+
+    def __bool__(self):
+        return bool(self._len)
+
+    __nonzero__ = __bool__
+
+    def _unravel(self, i):
+        """Return coordinate at flat index 0 <= `i` < len(self)."""
+        coord = []
+        for r, stride in _zip(self._ranges, self._strides):
+            q, i = divmod(i, stride)
+            coord.append(r._start + q * r._step)
+        return tuple(coord)
+
+    def __getitem__(self, i):
+        """self[i] -> coordinate tuple; self[i:j] -> lazy flat view;
+        self[s1, s2, ...] -> ndrange sliced along each axis."""
+        if isinstance(i, tuple):
+            if len(i) > len(self._ranges):
+                raise IndexError("too many indices for ndrange")
+            for s in i:
+                if not isinstance(s, slice):
+                    raise TypeError("ndrange per-axis indices must be slices")
+            return self.__class__(*[r[s] for r, s in
+                                    _zip(self._ranges, i + (slice(None),) *
+                                         (len(self._ranges) - len(i)))])
+        flat = lrange(self._len)
+        if isinstance(i, slice):
+            return lrange_map(self._unravel, flat[i])
+        return self._unravel(flat[i])
+
+    def index(self, coord):
+        """Return flat index of `coord`, the inverse of self[i].
+
+        Raise ValueError if `coord` is not present.
+        """
+        if not self._contains(coord):
+            raise ValueError("%r is not in ndrange" % (coord,))
+        i = 0
+        for r, stride, c in _zip(self._ranges, self._strides, coord):
+            i += r.index(c) * stride
+        return i
+
+    def _contains(self, coord):
+        return (isinstance(coord, tuple) and len(coord) == len(self._ranges)
+                and all([c in r for r, c in _zip(self._ranges, coord)]))
+
+    def __contains__(self, coord):
+        return self._contains(coord)
+
+    def iterator(self, index=0):
+        """Generate coordinates starting at self[index]."""
+        return self._iter(lrange(self._len)[index:])
+
+    def __iter__(self):
+        return self._iter(lrange(self._len))
+
+    def _iter(self, flat):
+        """Generate coordinates at flat indexes `flat` (step 1 lrange)."""
+        if not flat:
+            return
+        ranges = self._ranges
+        coord = list(self._unravel(flat._start))
+        pos = [r.index(c) for r, c in _zip(ranges, coord)]
+        n = flat._len
+        last = len(ranges) - 1
+        while True:
+            yield tuple(coord)
+            n -= 1
+            if not n:
+                return
+            # odometer: advance the last axis, carry into the previous ones
+            k = last
+            while True:
+                r = ranges[k]
+                pos[k] += 1
+                if pos[k] < r._len:
+                    coord[k] += r._step
+                    break
+                pos[k] = 0
+                coord[k] = r._start
+                k -= 1
+
+    def chunks(self, size):
+        """Generate consecutive lazy views of `size` coordinates each."""
+        for flat in lrange(self._len).chunks(size):
+            yield lrange_map(self._unravel, flat)
+
+    def split(self, k):
+        """Return `k` contiguous lazy views that partition self."""
+        return [lrange_map(self._unravel, flat)
+                for flat in lrange(self._len).split(k)]
+
+    def shard(self, i, n):
+        """Return `i`-th of `n` strided lazy views i.e., self[i::n]."""
+        return lrange_map(self._unravel, lrange(self._len).shard(i, n))
+
+    def __eq__(self, other):
+        if not isinstance(other, ndrange):
+            return NotImplemented
+        if not (self._len or other._len):
+            return True
+        return self._ranges == other._ranges
+
+    def __ne__(self, other):
+        if not isinstance(other, ndrange):
+            return NotImplemented
+        return not self == other
+
+    def __hash__(self):
+        if not self._len:
+            return hash(())
+        return hash(self._ranges)
+
+    def __reduce__(self):
+        return self.__class__, self._ranges
+
+    def __repr__(self):
+        return "%s(%s)" % (self.__class__.__name__,
+                           ", ".join(map(repr, self._ranges)))
+
+def _fraction(ob):
+    """Return real number `ob` as `Fraction` or None if it is not finite
+    or not a real number."""
+    if isinstance(ob, _Fraction):
+        return ob
+    if isinstance(ob, _numbers.Complex) and not isinstance(ob,
+                                                          _numbers.Real):
+        if ob.imag:
+            return None
+        ob = ob.real
+    # Fraction(Decimal), Fraction(float) need Python 2.7
+    if isinstance(ob, _Decimal):
+        if not ob.is_finite():
+            return None
+        return _Fraction.from_decimal(ob)
+    if not isinstance(ob, _numbers.Real):
+        return None
+    try:
+        if isinstance(ob, float):
+            return _Fraction.from_float(ob)
+        return _Fraction(ob)
+    except (OverflowError, ValueError, TypeError): # nan, inf
+        return None
+
+
+def _todecimal(q):
+    """Return `Fraction` `q` as `Decimal` (rounded only if it has no
+    finite decimal expansion)."""
+    den, k = q.denominator, 0
+    while den % 10 == 0:
+        den //= 10
+        k += 1
+    m = 1 # den * m is a power of ten
+    while den % 5 == 0:
+        den //= 5
+        m *= 2
+        k += 1
+    while den % 2 == 0:
+        den //= 2
+        m *= 5
+        k += 1
+    if den != 1:
+        return _Decimal(q.numerator) / _Decimal(q.denominator)
+    return _Decimal("%dE-%d" % (q.numerator * m, k))
+
+
+class frange(object):
+    """frange([start,] stop[, step]) -> exact range of rational numbers
+
+    Like `lrange` but `start`, `stop`, `step` may be `Fraction` or
+    `Decimal` (or int). Items ``start + i*step`` are computed exactly
+    (no accumulated rounding error) as `Fraction`, or as `Decimal` if
+    any argument is a Decimal. Floats are rejected: use
+    ``Fraction(repr(x))`` or ``Decimal(repr(x))`` to say what you mean.
+
+    >>> from decimal import Decimal
+    >>> r = frange(0, 1, Decimal('0.1'))
+    >>> len(r), r[3], Decimal('0.7') in r
+    (10, Decimal('0.3'), True)
+    >>> r.sum()
+    Decimal('4.5')
+    """
+
+    __slots__ = ('_start', '_step', '_len', '_decimal')
+
+    def __init__(self, *args):
+        nargs = len(args)
+        if nargs == 1:
+            args = (0,) + args + (1,)
+        elif nargs == 2:
+            args = args + (1,)
+        elif nargs != 3:
+            raise TypeError("frange(): wrong number of arguments," +
+                            " got %s" % (args,))
+        decimal = fraction = False
+        for x in args:
+            if isinstance(x, _Decimal):
+                decimal = True
+            elif isinstance(x, _numbers.Integral):
+                continue
+            elif isinstance(x, _numbers.Rational):
+                fraction = True
+            else:
+                raise TypeError("frange() arguments must be int, Fraction or"
+                                " Decimal, not %s" % (type(x).__name__,))
+            if _fraction(x) is None:
+                raise ValueError("frange() arguments must be finite")
+        if decimal and fraction:
+            raise TypeError("frange() arguments can't mix Fraction and Decimal")
+        start, stop, step = map(_fraction, args)
+        if step == 0:
+            raise ValueError("frange() arg 3 must not be zero")
+        self._init(start, step, max(0, -((start - stop) // step)), decimal)
+
+    def _init(self, start, step, n, decimal):
+        self._start = start
+        self._step = step
+        self._len = n
+        self._decimal = decimal
+
+    def _make(self, start, step, n):
+        """Return frange of `n` items: start, start + step, ..."""
+        r = self.__class__.__new__(self.__class__)
+        r._init(start, step, n, self._decimal)
+        return r
+
+    def _sub(self, idx):
+        """Return frange of self[i] for i in lrange `idx`."""
+        return self._make(self._start + idx._start * self._step,
+                          idx._step * self._step, idx._len)
+
+    def _out(self, q):
+        """Return exact `Fraction` `q` in the type of the items."""
+        if self._decimal:
+            return _todecimal(q)
+        return q
+
+    def length(self):
+        """len(self) might throw OverflowError, this method shouldn't."""
+        return self._len
+
+    length = property(length)
+
+    def __len__(self):
+        return len(lrange(self._len))
+
+    def __bool__(self):
+        return bool(self._len)
+
+    __nonzero__ = __bool__
+
+    def __getitem__(self, i):
+        idx = lrange(self._len)[i]
+        if isinstance(idx, lrange):
+            return self._sub(idx)
+        return self._out(self._start + idx * self._step)
+
+    def _position(self, ob):
+        """Return `i` such that self[i] == ob or None."""
+        x = _fraction(ob)
+        if x is None:
+            return None
+        i = (x - self._start) / self._step
+        if i.denominator == 1 and 0 <= i < self._len:
+            return i.numerator
+        return None
+
+    def __contains__(self, ob):
+        return self._position(ob) is not None
+
+    def index(self, ob):
+        """Return index of `ob`. Raise ValueError if it is not present."""
+        i = self._position(ob)
+        if i is None:
+            raise ValueError("%r is not in frange" % (ob,))
+        return i
+
+    def count(self, ob):
+        """Return number of occurrences of `ob`."""
+        return int(ob in self)
+
+    def __iter__(self):
+        for chunk in self.chunks(lrange._CHUNK, 'list'):
+            for x in chunk:
+                yield x
+
+    def __reversed__(self):
+        return self._sub(lrange(self._len)[::-1])
+
+    def chunks(self, size, materialize=None):
+        """Generate consecutive blocks of `size` items (the last may be shorter).
+
+        Blocks are `frange` objects or, if `materialize` is 'list', lists.
+        """
+        if materialize not in (None, 'list'):
+            raise ValueError("unknown materialize value: %r" % (materialize,))
+        for idx in lrange(self._len).chunks(size):
+            if materialize is None:
+                yield self._sub(idx)
+            else:
+                start, step, out = self._start, self._step, self._out
+                yield [out(start + i * step) for i in idx]
+
+    def split(self, k):
+        """Return a list of `k` contiguous franges that partition self.
+
+        See `lrange.split()`.
+        """
+        return [self._sub(idx) for idx in lrange(self._len).split(k)]
+
+    def shard(self, i, n):
+        """Return `i`-th of `n` strided shards i.e., self[i::n]."""
+        return self._sub(lrange(self._len).shard(i, n))
+
+    def _ascending(self):
+        """Return `(first, last)` for a non-empty self."""
+        first = self._start
+        last = first + (self._len - 1) * self._step
+        return min(first, last), max(first, last)
+
+    def sum(self):
+        """Return sum of items (0 if empty)."""
+        n = self._len
+        return self._out(n * self._start + self._step * (n * (n - 1) // 2))
+
+    def min(self):
+        """Return the smallest item."""
+        if not self._len:
+            raise ValueError("min() arg is an empty sequence")
+        return self._out(self._ascending()[0])
+
+    def max(self):
+        """Return the largest item."""
+        if not self._len:
+            raise ValueError("max() arg is an empty sequence")
+        return self._out(self._ascending()[1])
+
+    def mean(self):
+        """Return arithmetic mean."""
+        if not self._len:
+            raise _StatisticsError("mean requires at least one data point")
+        return self._out(sum(self._ascending()) / 2)
+
+    def median(self):
+        """Return median. Same as mean()."""
+        if not self._len:
+            raise _StatisticsError("no median for empty data")
+        return self.mean()
+
+    def pvariance(self):
+        """Return population variance."""
+        n = self._len
+        if not n:
+            raise _StatisticsError("pvariance requires at least one data point")
+        return self._out(self._step**2 * (n*n - 1) / 12)
+
+    def variance(self):
+        """Return sample variance."""
+        n = self._len
+        if n < 2:
+            raise _StatisticsError("variance requires at least two data points")
+        return self._out(self._step**2 * n * (n + 1) / 12)
+
+    def quantile(self, q):
+        """Return `q`-th quantile, 0 <= q <= 1, see `lrange.quantile()`."""
+        q = _Fraction(q)
+        if not 0 <= q <= 1:
+            raise ValueError("quantile must be in [0, 1], got %s" % (q,))
+        if not self._len:
+            raise _StatisticsError("no quantile for empty data")
+        first, last = self._ascending()
+        return self._out(first + q * (last - first))
+
+    def _key(self):
+        """Canonical form: franges that have the same items share it."""
+        if self._len == 0:
+            return (0, None, None)
+        elif self._len == 1:
+            return (1, self._start, None)
+        else:
+            return (self._len, self._start, self._step)
+
+    def __eq__(self, other):
+        if not isinstance(other, frange):
+            return NotImplemented
+        return self._key() == other._key()
+
+    def __ne__(self, other):
+        if not isinstance(other, frange):
+            return NotImplemented
+        return not self == other
+
+    def __hash__(self):
+        return hash(self._key())
+
+    def _args(self):
+        return tuple(map(self._out, (self._start,
+                                     self._start + self._len * self._step,
+                                     self._step)))
+
+    def __reduce__(self):
+        return self.__class__, self._args()
+
+    def __repr__(self):
+        return "%s(%s)" % (self.__class__.__name__,
+                           ", ".join(map(repr, self._args())))
+
+
+def _map_range(r, func):
+    return [func(x) for x in r]
+
+
+def _reduce_range(r, func, initial):
+    acc = initial
+    for x in r:
+        acc = func(acc, x)
+    return acc
+
+
+def _call(task, extra, args):
+    """Return ``(True, task(lrange(*args), *extra))`` or ``(False, error)``.
+
+    Run in a pool worker.
+    """
+    try:
+        return True, task(lrange(*args), *extra)
+    except Exception:
+        return False, _sys.exc_info()[1]
+
+
+def _pool_results(task, extra, pieces, workers, ordered, threads,
+                  max_pending):
+    """Generate results of `task` for sub-lranges `pieces` from a pool."""
+    from multiprocessing.pool import Pool, ThreadPool
+    try:
+        import queue
+    except ImportError: # Python 2.x
+        import Queue as queue
+    if not threads: # fail early: an unpicklable task may hang Python 2 pool
+        _pickle.dumps((task, extra), 2)
+    pool = (threads and ThreadPool or Pool)(workers)
+    try:
+        pending = _deque()
+        done = queue.Queue()
+        kwargs = {}
+        if not ordered:
+            kwargs['callback'] = done.put
+            if _sys.version_info[0] >= 3: # e.g., unpicklable result
+                kwargs['error_callback'] = lambda e: done.put((False, e))
+        for r in pieces:
+            pending.append(pool.apply_async(_call, (task, extra,
+                                                    r.__getnewargs__()),
+                                            **kwargs))
+            if len(pending) >= max_pending:
+                yield _result(pending, done, ordered)
+        while pending:
+            yield _result(pending, done, ordered)
+    finally:
+        # on error or if the consumer stopped early, wait for the blocks
+        # in flight: Pool.terminate() may deadlock with its task handler
+        pool.close()
+        pool.join()
+
+
+def _result(pending, done, ordered):
+    """Return the next task result; re-raise its error."""
+    if ordered:
+        ok, value = pending.popleft().get()
+    else:
+        pending.pop() # only the count matters
+        ok, value = done.get()
+    if not ok:
+        raise value
+    return value
+
+
+def _chain_results(results):
+    try:
+        for values in results:
+            for value in values:
+                yield value
+    finally:
+        results.close() # close and join the pool now, not when collected
+
+def _prf(key, x, bits):
+    """Return `bits`-bit pseudorandom function of integers `key`, `x`."""
+    digest, counter = "", 0
+    while len(digest) * 4 < bits:
+        data = ("%x:%x:%x" % (key, x, counter)).encode("ascii")
+        digest += _hashlib.sha256(data).hexdigest()
+        counter += 1
+    return int(digest, 16) >> (len(digest) * 4 - bits)
+
+
+class _Feistel(object):
+    """Keyed bijection of range(n) (Feistel network with cycle walking).
+
+    Round keys come from `_prf()` once per seed; the round function
+    itself is an integer multiply-xorshift mix whose output is the top
+    bits of a `_WORD` bits wider product. The halves may differ by one
+    bit so that the domain is less than 2*n.
+    """
+
+    __slots__ = ('_n', '_low', '_mask', '_keys')
+
+    _ROUNDS = 6 # even: the halves get back their widths
+    _WORD = 32
+
+    def __init__(self, n, seed):
+        self._n = n
+        bits = max(2, len(bin(n - 1)) - 2)
+        self._low = low = (bits + 1) // 2
+        self._mask = (1 << low) - 1
+        width = low + self._WORD
+        masks = ((1 << (bits - low)) - 1, self._mask) # high, low half
+        self._keys = [(_prf(seed, 2 * i, width),
+                       _prf(seed, 2 * i + 1, width) | 1, # odd multiplier
+                       masks[i % 2]) # the half that the round updates
+                      for i in xrange(self._ROUNDS)]
+
+    def __call__(self, x):
+        low, mask = self._low, self._mask
+        wide, top = (1 << (low + self._WORD)) - 1, self._WORD
+        shift = (low + top) // 2
+        while True: # cycle walking
+            left, right = x >> low, x & mask
+            for offset, multiplier, out in self._keys:
+                f = ((right + offset) * multiplier) & wide
+                f = ((f ^ (f >> shift)) * multiplier) & wide
+                left, right = right, (left ^ (f >> top)) & out
+            x = (left << low) | right
+            if x < self._n:
+                return int(x) # int, not long on Python 2.x if possible
+
+
+class lrange_permutation(lrange_iterator):
+    """lrange_permutation(r[, seed[, index]]) -> pseudorandom order iterator
+
+    Yields every item of lrange `r` exactly once in an order determined
+    by integer `seed`. Like `lrange_iterator` it is seekable, picklable
+    and O(1) in memory:
+
+    >>> it = lrange(10).permuted(seed=1)
+    >>> sorted(it)
+    [0, 1, 2, 3, 4, 5, 6, 7, 8, 9]
+    >>> list(lrange(10).permuted(seed=1)) == list(lrange(10).permuted(1))
+    True
+    """
+
+    __slots__ = ('_seed', '_perm')
+
+    def __init__(self, r, seed=None, index=0):
+        if seed is None:
+            seed = _random.getrandbits(64)
+        self._seed = _toindex(seed)
+        lrange_iterator.__init__(self, r, index)
+        self._perm = _Feistel(max(r._len, 1), self._seed)
+
+    def seed(self):
+        """Seed that reproduces the order."""
+        return self._seed
+
+    seed = property(seed)
+
+    def __next__(self):
+        i = self._index
+        r = self._range
+        if i >= r._len:
+            raise StopIteration
+        self._index = i + 1
+        return r._start + self._perm(i) * r._step
+
+    next = __next__ # Python 2.x
+
+    def __reduce__(self):
+        return self.__class__, (self._range, self._seed, self._index)
+
+    def token(self):
+        """Return compact string that `from_token()` resumes from."""
+        r = self._range
+        return "%x:%x:%x:%x:%x" % (r._start, r._stop, r._step, self._seed,
+                                   self._index)
+
+    def from_token(cls, token):
+        """Return iterator at the position saved by `token()`."""
+        try:
+            start, stop, step, seed, index = [int(s, 16)
+                                              for s in token.split(':')]
+            return cls(lrange(start, stop, step), seed, index)
+        except (AttributeError, IndexError, ValueError): # e.g., zero step
+            raise ValueError("invalid lrange_permutation token: %r" % (token,))
+
+    from_token = classmethod(from_token)
+
+
+def _bounds(r):
+    """Return `(lo, hi)` such that lo <= item < hi for all items of `r`."""
+    if not r._len:
+        return 0, 0 # all empty lranges are equal
+    first, last, _ = r._ascending()
+    return first, last + 1
+
+
+def _span(ob):
+    """Return `(lo, hi)` half-open bounds of integer or contiguous lrange."""
+    if not isinstance(ob, lrange):
+        ob = _toindex(ob)
+        return ob, ob + 1
+    if ob._len > 1 and abs(ob._step) != 1:
+        raise ValueError("RangeSet span must be contiguous, got %r" % (ob,))
+    return _bounds(ob)
+
+
+class RangeSet(object):
+    """RangeSet([spans]) -> set of integers stored as disjoint spans
+
+    Each span is an integer or an lrange with contiguous items
+    (step 1 or -1). Spans are kept sorted and merged, so membership is
+    O(log k) for k spans and iteration is lazy and ordered.
+
+    >>> s = RangeSet([lrange(10, 20), lrange(0, 5), 5, lrange(15, 30)])
+    >>> s
+    RangeSet([lrange(0, 6), lrange(10, 30)])
+    >>> 25 in s, 7 in s
+    (True, False)
+    >>> s.remove(lrange(12, 14))
+    >>> s.spans()
+    [lrange(0, 6), lrange(10, 12), lrange(14, 30)]
+    >>> len(s)
+    24
+    """
+
+    def __init__(self, spans=()):
+        self._starts = []
+        self._stops = []
+        for span in spans:
+            self.add(span)
+
+    def add(self, span):
+        """Add all items of `span` to the set."""
+        lo, hi = _span(span)
+        if lo >= hi:
+            return
+        # merge overlapping and adjacent spans
+        i = _bisect.bisect_left(self._stops, lo)
+        j = _bisect.bisect_right(self._starts, hi)
+        if i < j:
+            lo = min(lo, self._starts[i])
+            hi = max(hi, self._stops[j-1])
+        self._starts[i:j] = [lo]
+        self._stops[i:j] = [hi]
+
+    def remove(self, span):
+        """Remove items of `span` that are present in the set."""
+        lo, hi = _span(span)
+        if lo >= hi:
+            return
+        i = _bisect.bisect_right(self._stops, lo)
+        j = _bisect.bisect_left(self._starts, hi)
+        if i >= j:
+            return
+        starts, stops = [], []
+        if self._starts[i] < lo:
+            starts.append(self._starts[i])
+            stops.append(lo)
+        if self._stops[j-1] > hi:
+            starts.append(hi)
+            stops.append(self._stops[j-1])
+        self._starts[i:j] = starts
+        self._stops[i:j] = stops
+
+    def spans(self):
+        """Return sorted list of disjoint lrange objects."""
+        return [lrange(lo, hi) for lo, hi in zip(self._starts, self._stops)]
+
+    def copy(self):
+        s = self.__class__()
+        s._starts = self._starts[:]
+        s._stops = self._stops[:]
+        return s
+
+    def union(self, other):
+        s = self.copy()
+        for span in other.spans():
+            s.add(span)
+        return s
+
+    def intersection(self, other):
+        s = self.__class__()
+        a, b = self.spans(), other.spans()
+        i = j = 0
+        while i < len(a) and j < len(b):
+            lo = max(a[i]._start, b[j]._start)
+            hi = min(a[i]._stop, b[j]._stop)
+            if lo < hi:
+                s._starts.append(lo)
+                s._stops.append(hi)
+            if a[i]._stop < b[j]._stop:
+                i += 1
+            else:
+                j += 1
+        return s
+
+    def difference(self, other):
+        s = self.copy()
+        for span in other.spans():
+            s.remove(span)
+        return s
+
+    def complement(self, bounds):
+        """Return items of contiguous lrange `bounds` that are not in self."""
+        return self.__class__([bounds]).difference(self)
+
+    def __or__(self, other):
+        if not isinstance(other, RangeSet):
+            return NotImplemented
+        return self.union(other)
+
+    def __and__(self, other):
+        if not isinstance(other, RangeSet):
+            return NotImplemented
+        return self.intersection(other)
+
+    def __sub__(self, other):
+        if not isinstance(other, RangeSet):
+            return NotImplemented
+        return self.difference(other)
+
+    def length(self):
+        """len(self) might throw OverflowError, this method shouldn't."""
+        return sum([hi - lo for lo, hi in zip(self._starts, self._stops)])
+
+    length = property(length)
+
+    def __len__(self):
+        return len(lrange(self.length))
+
+    def __bool__(self):
+        return bool(self._starts)
+
+    __nonzero__ = __bool__
+
+    def __contains__(self, ob):
+        if type(ob) not in (int, long, bool):
+            if self._starts:
+                i = _integral(ob, self._starts[0], self._stops[-1] - 1)
+            else:
+                i = _integral(ob, 1, 0) # nothing is in between
+            if i is _OPAQUE:
+                return any(ob in span for span in self.spans())
+            elif i is None:
+                return False
+            ob = i
+        i = _bisect.bisect_right(self._starts, ob) - 1
+        return i >= 0 and ob < self._stops[i]
+
+    def __iter__(self):
+        for span in self.spans():
+            for i in span:
+                yield i
+
+    def __eq__(self, other):
+        if not isinstance(other, RangeSet):
+            return NotImplemented
+        return self._starts == other._starts and self._stops == other._stops
+
+    def __ne__(self, other):
+        if not isinstance(other, RangeSet):
+            return NotImplemented
+        return not self == other
+
+    __hash__ = None # mutable
+
+    def __repr__(self):
+        return "%s(%r)" % (self.__class__.__name__, self.spans())
+
+
+class _StabTree(object):
+    """Static implicit interval tree over lranges, see `LRangeIndex`.
+
+    Ranges are sorted by their lowest item; ``maxhi[mid]`` is the maximum
+    upper bound in the subtree rooted at `mid` of the implicit binary
+    tree over the sorted array. Deleted entries are set to None.
+    """
+
+    __slots__ = ('lo', 'hi', 'ranges', 'maxhi', 'deleted')
+
+    def __init__(self, ranges):
+        keyed = [(_bounds(r), r) for r in ranges]
+        keyed.sort(key=lambda item: item[0])
+        self.lo = [lo for (lo, hi), r in keyed]
+        self.hi = [hi for (lo, hi), r in keyed]
+        self.ranges = [r for bounds, r in keyed]
+        self.maxhi = self.hi[:]
+        self.deleted = 0
+
+        def build(a, b): # -> max hi in [a, b)
+            mid = (a + b) // 2
+            m = self.hi[mid]
+            if a < mid:
+                m = max(m, build(a, mid))
+            if mid + 1 < b:
+                m = max(m, build(mid + 1, b))
+            self.maxhi[mid] = m
+            return m
+
+        if self.lo:
+            build(0, len(self.lo))
+
+    def __len__(self):
+        return len(self.lo) - self.deleted
+
+    def live(self):
+        return [r for r in self.ranges if r is not None]
+
+    def delete(self, r):
+        """Remove one lrange equal to `r`; return whether it was found."""
+        lo = _bounds(r)[0]
+        i = _bisect.bisect_left(self.lo, lo)
+        while i < len(self.lo) and self.lo[i] == lo:
+            if self.ranges[i] is not None and self.ranges[i] == r:
+                self.ranges[i] = None
+                self.deleted += 1
+                return True
+            i += 1
+        return False
+
+    def candidates(self, lo, hi):
+        """Generate indexes of live entries whose bounds meet [lo, hi)."""
+        stack = [(0, len(self.lo))]
+        while stack:
+            a, b = stack.pop()
+            if a >= b:
+                continue
+            mid = (a + b) // 2
+            if self.maxhi[mid] <= lo:
+                continue # nothing in [a, b) reaches lo
+            stack.append((a, mid))
+            if self.lo[mid] < hi:
+                if self.hi[mid] > lo and self.ranges[mid] is not None:
+                    yield mid
+                stack.append((mid + 1, b))
+
+
+class LRangeIndex(object):
+    """LRangeIndex([ranges]) -> index for point and overlap queries
+
+    Answers "which of many lranges contain x" in O(log(n)**2 + hits):
+    ranges are kept in O(log n) static interval trees (see `_StabTree`)
+    of at most 1, 2, 4, ... items; an insert merges the full smaller
+    trees into the next one (amortized O(log(n)**2)), so there is no
+    unindexed buffer to scan. Only candidates whose bounds meet the
+    query get the O(1) step check of `lrange.__contains__`.
+
+    Deletes leave tombstones; everything is rebuilt when they exceed a
+    fraction of the size. Results are sorted by the lowest item.
+
+    >>> index = LRangeIndex([lrange(0, 100, 2), lrange(50, 60), lrange(7)])
+    >>> index.stab(54)
+    [lrange(0, 100, 2), lrange(50, 60)]
+    >>> index.stab(55)
+    [lrange(50, 60)]
+    """
+
+    _REBUILD_MIN = 64
+
+    def __init__(self, ranges=()):
+        ranges = list(ranges)
+        for r in ranges:
+            self._check(r)
+        self._levels = [] # level k: a _StabTree of at most 2**k items or None
+        self._deleted = 0
+        self._store(ranges)
+
+    def _check(self, r):
+        if not isinstance(r, lrange):
+            raise TypeError("LRangeIndex items must be lrange, not %s"
+                            % (type(r).__name__,))
+
+    def _store(self, ranges):
+        """Replace all levels with a single tree of `ranges`."""
+        k = max(len(ranges) - 1, 0)
+        level = 0
+        while k:
+            k >>= 1
+            level += 1
+        self._levels = [None] * level + [_StabTree(ranges)]
+        self._deleted = 0
+
+    def insert(self, r):
+        """Add lrange `r` to the index."""
+        self._check(r)
+        ranges = [r]
+        k = 0
+        levels = self._levels
+        while k < len(levels) and levels[k] is not None:
+            ranges.extend(levels[k].live()) # <= 1 + 2**0 + ... = 2**k items
+            levels[k] = None
+            k += 1
+        if k == len(levels):
+            levels.append(None)
+        levels[k] = _StabTree(ranges)
+
+    def delete(self, r):
+        """Remove one lrange equal to `r`; ValueError if there is none."""
+        self._check(r)
+        for tree in self._levels:
+            if tree is not None and tree.delete(r):
+                self._deleted += 1
+                if self._deleted > max(self._REBUILD_MIN, len(self) // 4):
+                    self._store(list(self))
+                return
+        raise ValueError("LRangeIndex.delete(r): r not in index")
+
+    def _hits(self, lo, hi, match):
+        """Return lranges with bounds meeting [lo, hi) that `match()`."""
+        hits = []
+        for tree in self._levels:
+            if tree is not None:
+                for i in tree.candidates(lo, hi):
+                    r = tree.ranges[i]
+                    if match(r):
+                        hits.append((tree.lo[i], r))
+        hits.sort(key=lambda hit: hit[0])
+        return [r for lo, r in hits]
+
+    def stab(self, x):
+        """Return list of lranges that contain integer `x`."""
+        x = _toindex(x)
+        return self._hits(x, x + 1, lambda r: x in r)
+
+    def stab_many(self, xs):
+        """Return list of `stab(x)` results for each `x` in `xs`."""
+        return [self.stab(x) for x in xs]
+
+    def overlap(self, q):
+        """Return list of lranges that have at least one item in common with `q`."""
+        self._check(q)
+        if not q:
+            return []
+        lo, hi = _bounds(q)
+        return self._hits(lo, hi, lambda r: not r.isdisjoint(q))
+
+    def __len__(self):
+        return sum([len(tree) for tree in self._levels if tree is not None])
+
+    def __iter__(self):
+        for tree in self._levels:
+            if tree is not None:
+                for r in tree.live():
+                    yield r
@@ -7,7 +7,10 @@ Usage:
 Requires: nose (``$ pip install nose``)
 """
 from __future__ import nested_scopes
+import numbers
 import pickle
+import random
+from fractions import Fraction
 import sys
 import unittest
 
@@ -25,7 +28,8 @@ except NameError:        # Python 3.x
 
 import nose
 
-from lrange import lrange
+from lrange import (lrange, lrange_iterator, lrange_permutation, LRangeIndex,
+                    lrange_map, ndrange, frange, RangeSet)
 
 if hasattr(sys, "maxint"):
     MAXINT = sys.maxint
@@ -68,6 +72,15 @@ def ispypy():
     return hasattr(sys, 'pypy_version_info')
 
 
+def nonumpy():
+    """Whether NumPy is not installed."""
+    try:
+        import numpy
+    except ImportError:
+        return True
+    return False
+
+
 def eq_range(a, start, stop, step):
     """Assert that `a` is a range defined by `start`, `stop`, `step`."""
     i = start
@@ -272,17 +285,129 @@ def _test_pickle(proto):
         eq_lrange(rp, r)
 
 
+# lrange(3, 10**30, 7) pickled by lrange 0.x (instance __dict__ state)
+_LEGACY_PICKLES = [
+    # Python 2, protocols 0 and 2
+    b"ccopy_reg\n_reconstructor\np0\n(clrange\nlrange\np1\nc__builtin__\n"
+    b"object\np2\nNtp3\nRp4\n(dp5\nS'_step'\np6\nI7\nsS'_stop'\np7\n"
+    b"L1000000000000000000000000000000L\nsS'_start'\np8\nI3\nsb.",
+    b"\x80\x02clrange\nlrange\nq\x00K\x03\x8a\r\x00\x00\x00@\xea\xedtF\xd0"
+    b"\x9c,\x9f\x0cK\x07\x87q\x01\x81q\x02}q\x03(U\x05_stepq\x04K\x07U\x05"
+    b"_stopq\x05\x8a\r\x00\x00\x00@\xea\xedtF\xd0\x9c,\x9f\x0cU\x06_startq"
+    b"\x06K\x03ub.",
+    # Python 3, protocols 1 and 4
+    b"ccopy_reg\n_reconstructor\nq\x00(clrange\nlrange\nq\x01c__builtin__\n"
+    b"object\nq\x02Ntq\x03Rq\x04}q\x05(X\x06\x00\x00\x00_startq\x06K\x03X"
+    b"\x05\x00\x00\x00_stopq\x07L1000000000000000000000000000000L\nX\x05"
+    b"\x00\x00\x00_stepq\x08K\x07ub.",
+    b"\x80\x04\x95V\x00\x00\x00\x00\x00\x00\x00\x8c\x06lrange\x94h\x00\x93"
+    b"\x94K\x03\x8a\r\x00\x00\x00@\xea\xedtF\xd0\x9c,\x9f\x0cK\x07\x87\x94"
+    b"\x81\x94}\x94(\x8c\x06_start\x94K\x03\x8c\x05_stop\x94\x8a\r\x00\x00"
+    b"\x00@\xea\xedtF\xd0\x9c,\x9f\x0c\x8c\x05_step\x94K\x07ub.",
+]
+
+
+def test_unpickle_legacy():
+    expected = lrange(3, 10**30, 7)
+    for data in _LEGACY_PICKLES:
+        if data[:1] == b"\x80" and ord(data[1:2]) > pickle.HIGHEST_PROTOCOL:
+            continue
+        r = pickle.loads(data)
+        yield eq_lrange, r, expected
+        yield nose.tools.eq_, r.length, expected.length
+        yield nose.tools.eq_, r[-1], expected[-1]
+        yield nose.tools.ok_, 10**30 - 5 in r
+
+
 def test_equility():
     for args in _get_lranges_args():
         a, b = lrange(*args), lrange(*args)
         yield nose.tools.ok_, a is not b
-        yield nose.tools.assert_not_equals, a, b
+        yield nose.tools.eq_, a, b
+        yield nose.tools.eq_, hash(a), hash(b)
         yield nose.tools.eq_, a.length, b.length
         if a.length < LENGTH_CUTOFF: # skip long
             yield nose.tools.eq_, list(a), list(b), (a, b)
         yield eq_lrange, a, b
 
 
+def test_equility_canonical():
+    for args in _get_short_lranges_args():
+        a = lrange(*args)
+        for other in _get_short_lranges_args():
+            b = lrange(*other)
+            equal = list(a) == list(b)
+            yield nose.tools.eq_, a == b, equal, (a, b)
+            yield nose.tools.eq_, a != b, not equal, (a, b)
+            if equal:
+                yield nose.tools.eq_, hash(a), hash(b), (a, b)
+
+    N = 10**100
+    yield nose.tools.eq_, lrange(N, N+1, 5), lrange(N, N-1, -1)
+    yield nose.tools.eq_, lrange(N, N-1), lrange(0)
+    yield nose.tools.eq_, lrange(0, N, 2), lrange(0, N-1, 2)
+    yield nose.tools.assert_not_equals, lrange(0, N, 2), lrange(0, N, 3)
+    yield nose.tools.assert_not_equals, lrange(3), [0, 1, 2]
+    yield nose.tools.eq_, {lrange(N, N+1): 1}[lrange(N, N+2, 2)], 1
+
+
+def _pure_lrange(*args):
+    """Return lrange built without the native range (as on Python 2)."""
+    module = sys.modules[lrange.__module__]
+    native_range = module._native_range
+    module._native_range = None
+    try:
+        return lrange(*args)
+    finally:
+        module._native_range = native_range
+
+
+def test_native_lazy():
+    slot = lrange.__dict__['_native']
+    r = lrange(BIGINT)[2:8]
+    native = sys.modules[lrange.__module__]._native_range
+    if native is not None:
+        yield nose.tools.assert_raises, AttributeError, slot.__get__, r
+        yield nose.tools.eq_, r[1], 3
+        yield nose.tools.eq_, slot.__get__(r), native(2, 8)
+    yield nose.tools.assert_raises, AttributeError, getattr, r, '_missing'
+
+
+def test_pure_python_paths():
+    for args in _get_short_lranges_args():
+        pure, ir, L = _pure_lrange(*args), lrange(*args), list(range(*args))
+        yield nose.tools.ok_, pure._native is None
+        yield nose.tools.eq_, pure, ir
+        yield nose.tools.ok_, not pure != ir
+        yield nose.tools.eq_, hash(pure), hash(ir)
+        yield nose.tools.eq_, list(pure), L
+        yield nose.tools.eq_, [pure[i] for i in range(-len(L), len(L))], L + L
+        yield nose.tools.assert_raises, IndexError, pure.__getitem__, len(L)
+        yield (nose.tools.eq_, [x in pure for x in range(-110, 110)],
+               [x in L for x in range(-110, 110)])
+        for s in _get_slices()[:40]:
+            yield nose.tools.eq_, pure[s], ir[s], s
+        yield nose.tools.eq_, [pure.count(i) for i in L], [1] * len(L)
+        yield nose.tools.eq_, [pure.index(i) for i in L], list(range(len(L)))
+    for args in [(5, 1), (3, 4, 7), (0, 10, 3), (9, -1, -3)]:
+        a = _pure_lrange(*args)
+        for other in [(0,), (3, 4), (0, 12, 3), (9, -2, -3), (0, 10, 3)]:
+            b = _pure_lrange(*other)
+            yield nose.tools.eq_, a == b, list(a) == list(b), (a, b)
+            if a == b:
+                yield nose.tools.eq_, hash(a), hash(b)
+    yield nose.tools.eq_, _pure_lrange(BIGINT)[-1], BIGINT - 1
+
+
+def test_immutable():
+    r = lrange(10)
+    yield nose.tools.ok_, not hasattr(r, '__dict__')
+    yield nose.tools.assert_raises, AttributeError, setattr, r, '_start', 1
+    yield nose.tools.assert_raises, AttributeError, setattr, r, 'x', 1
+    yield nose.tools.assert_raises, AttributeError, delattr, r, '_stop'
+    yield nose.tools.eq_, list(r), list(range(10))
+
+
 def test_contains():
     class IntSubclass(int):
         pass
@@ -298,6 +423,96 @@ def test_contains():
         yield nose.tools.ok_, IntSubclass(-1) not in r
 
 
+def _count_scans(func):
+    """Return number of linear scans done by `in` tests in func()."""
+    lrange.reset_stats()
+    lrange.enable_stats()
+    try:
+        func()
+    finally:
+        lrange.disable_stats()
+    return lrange.stats().get(('contains', 'scan'), (0, 0))[0]
+
+
+def test_contains_numbers():
+    from decimal import Decimal
+    N = 10**80
+    r = lrange(-N, N, 2)
+    cases = [(2.0, True), (3.0, False), (2.5, False),
+             (float('nan'), False), (float('inf'), False),
+             (Fraction(4), True), (Fraction(4, 3), False),
+             (Decimal(6), True), (Decimal('6.5'), False),
+             (Decimal('NaN'), False), (complex(8, 0), True),
+             (complex(8, 1), False), (1e80, False),
+             (float(2**200), True), (-float(2**270), False)]
+    for ob, expected in cases:
+        yield nose.tools.eq_, ob in r, expected, ob
+        yield nose.tools.eq_, r.count(ob), int(expected), ob
+        if expected:
+            yield nose.tools.eq_, r.index(ob), (int(ob.real) + N) // 2
+        else:
+            yield nose.tools.assert_raises, ValueError, r.index, ob
+    yield nose.tools.eq_, _count_scans(lambda: [ob in r for ob, _ in cases]), 0
+    yield nose.tools.ok_, 'a' not in lrange(3)
+    yield nose.tools.eq_, _count_scans(lambda: 'a' in lrange(3)), 1
+    yield nose.tools.ok_, 2.0 in RangeSet([lrange(-N, N)])
+    # out-of-range numbers are rejected without int(): it takes minutes here
+    huge = Decimal('1E+1000000')
+    for r in [lrange(10), lrange(10, 0, -1), lrange(0)]:
+        yield nose.tools.ok_, huge not in r
+        yield nose.tools.eq_, r.count(huge), 0
+        yield nose.tools.assert_raises, ValueError, r.index, huge
+    yield nose.tools.ok_, huge not in RangeSet([lrange(3)])
+    yield (nose.tools.eq_, [lrange(10)._searchsorted1(v, 'left') for v in
+                            [huge, Decimal('-1E+1000000')]], [10, 0])
+    yield nose.tools.eq_, lrange(10, 0, -1)._searchsorted1(huge, 'right'), 0
+    # numbers lrange can't convert are compared item by item
+    for ob in [_BadIndex(), _OpaqueNumber()]:
+        yield nose.tools.ok_, ob in lrange(3) and ob not in lrange(2, 5)
+        yield nose.tools.eq_, _count_scans(lambda: ob in lrange(3)), 1
+
+
+class _BadIndex(object):
+    def __index__(self):
+        raise TypeError("not an integer")
+    def __eq__(self, other):
+        return other == 1
+    __hash__ = None
+
+
+class _OpaqueNumber(numbers.Number):
+    def __eq__(self, other):
+        return other == 1
+    __hash__ = None
+
+
+@skipif(nonumpy)
+def test_contains_numpy():
+    import numpy as np
+    r = lrange(-BIGINT, BIGINT, 3) # items are 2 modulo 3
+    yield nose.tools.ok_, np.int64(2) in r
+    yield nose.tools.ok_, np.int64(3) not in r
+    yield nose.tools.ok_, np.float64(5.0) in r
+    yield nose.tools.ok_, np.float64(5.5) not in r
+    yield nose.tools.eq_, r.index(np.int32(-1)), (BIGINT - 1) // 3
+    yield (nose.tools.eq_, _count_scans(lambda: [np.int64(2) in r,
+                                                 np.float64(5.5) in r]), 0)
+
+
+@skipif(nonumpy)
+def test_index_numpy():
+    import numpy as np
+    for r in [lrange(10), lrange(-BIGINT, BIGINT, 3)]:
+        yield nose.tools.eq_, r[np.int64(3)], r[3]
+        yield nose.tools.eq_, r[np.int8(-1)], r[-1]
+        yield nose.tools.eq_, r[np.int64(1):np.uint8(7):np.int32(2)], r[1:7:2]
+        yield nose.tools.assert_raises, IndexError, lrange(3).__getitem__, \
+              np.int64(3)
+        yield nose.tools.assert_raises, TypeError, r.__getitem__, \
+              np.float64(3)
+    yield nose.tools.eq_, lrange(np.int64(2), np.uint16(9)), lrange(2, 9)
+
+
 def test_repr():
     yield nose.tools.eq_, repr(lrange(True)), repr(lrange(1))
     for r in _get_lranges():
@@ -380,6 +595,18 @@ def test_index_error():
     for i in [-11, 10, 11]:
         yield nose.tools.assert_raises, IndexError, r.__getitem__, i
 
+def test_error_messages():
+    for r in [lrange(10), lrange(BIGINT, BIGINT + 10)]:
+        for func, arg, exc in [(r.__getitem__, 10, IndexError),
+                               (r.__getitem__, -11, IndexError),
+                               (r.index, -1, ValueError)]:
+            try:
+                func(arg)
+            except exc:
+                yield nose.tools.ok_, 'lrange' in str(sys.exc_info()[1])
+            else:
+                assert 0, (func, arg)
+
 def test_getitem():
     r = lrange(MAXINT-2, MAXINT+3)
     for i in range(5):
@@ -393,6 +620,1095 @@ def test_getitem():
     yield nose.tools.eq_, L, list(r)
 
 
+def _get_slices():
+    bounds = [None, -12, -5, -1, 0, 1, 3, 7, 12]
+    return [slice(start, stop, step)
+            for start in bounds
+            for stop in bounds
+            for step in [None, -3, -1, 1, 2]]
+
+
+def test_getitem_slice():
+    for args in _get_short_lranges_args():
+        ir, L = lrange(*args), list(range(*args))
+        for s in _get_slices():
+            yield nose.tools.eq_, list(ir[s]), L[s], (args, s)
+
+
+def test_getitem_slice_big():
+    N = 10**50
+    r = lrange(BIGINT)
+    s = r[N:N+1000:7]
+    yield nose.tools.ok_, isinstance(s, lrange)
+    yield nose.tools.eq_, list(s), list(range(N, N+1000, 7))
+    yield nose.tools.eq_, r[::-1][0], BIGINT-1
+    yield nose.tools.eq_, r[::-1].length, BIGINT
+    yield nose.tools.eq_, r[-3:].length, 3
+    yield nose.tools.eq_, list(r[-3:]), [BIGINT-3, BIGINT-2, BIGINT-1]
+    yield nose.tools.eq_, r[2*BIGINT:].length, 0
+    yield nose.tools.eq_, r[:-BIGINT-1:-N].length, BIGINT // N
+    yield nose.tools.eq_, list(r[N:N-1]), []
+    yield nose.tools.eq_, list(lrange(N, -N, -N)[::-1]), [-N+N, N]
+
+
+def test_getitem_slice_errors():
+    r = lrange(10)
+    yield nose.tools.assert_raises, ValueError, r.__getitem__, slice(0, 1, 0)
+    yield nose.tools.assert_raises, TypeError, r.__getitem__, slice(0.5, 1)
+    yield nose.tools.assert_raises, TypeError, r.__getitem__, 1.5
+
+
+def test_index_count():
+    for args in _get_short_lranges_args():
+        ir, L = lrange(*args), list(range(*args))
+        for ob in range(-100, 100, 7):
+            yield nose.tools.eq_, ir.count(ob), L.count(ob)
+            for window in [(), (3,), (-4,), (2, 5), (-5, -1), (1, 100)]:
+                try:
+                    expected = L.index(ob, *window)
+                except ValueError:
+                    yield ((nose.tools.assert_raises, ValueError,
+                            ir.index, ob) + window)
+                else:
+                    yield nose.tools.eq_, ir.index(ob, *window), expected
+
+
+def test_index_count_big():
+    N = 10**80
+    r = lrange(-N, N, 3)
+    yield nose.tools.eq_, r.index(-N), 0
+    yield nose.tools.eq_, r.index(r[-1]), r.length-1
+    yield nose.tools.eq_, r.index(r[-1], -1), r.length-1
+    yield nose.tools.assert_raises, ValueError, r.index, r[-1], 0, -1
+    yield nose.tools.assert_raises, ValueError, r.index, N
+    yield nose.tools.eq_, r.count(2), 1
+    yield nose.tools.eq_, r.count(0), 0
+    yield nose.tools.eq_, r.count(True), 0
+    yield nose.tools.eq_, lrange(10).index(2.0), 2
+    yield nose.tools.eq_, lrange(10).count(2.0), 1
+    yield nose.tools.assert_raises, ValueError, lrange(10).index, 2.5
+
+
+class _EqualsOne(object):
+    def __eq__(self, other):
+        return other == 1
+    def __ne__(self, other):
+        return not self == other
+    __hash__ = None
+
+
+def test_index_count_opaque():
+    r = lrange(3)
+    yield nose.tools.assert_raises, ValueError, r.index, 'a'
+    yield nose.tools.eq_, r.count('a'), 0
+    yield nose.tools.eq_, r.index(_EqualsOne()), 1
+    yield nose.tools.eq_, r.index(_EqualsOne(), 1, 2), 1
+    yield nose.tools.assert_raises, ValueError, r.index, _EqualsOne(), 2
+    yield nose.tools.eq_, r.count(_EqualsOne()), 1
+    yield nose.tools.eq_, lrange(BIGINT, BIGINT + 3).count(_EqualsOne()), 0
+
+
+@skipif(nonumpy)
+def test_to_numpy():
+    import numpy as np
+    for args in _get_short_lranges_args():
+        ir, L = lrange(*args), list(range(*args))
+        a = np.asarray(ir)
+        yield nose.tools.eq_, a.dtype, np.int64
+        yield nose.tools.eq_, a.tolist(), L
+        a = ir.to_numpy(np.int8, offset=True)
+        yield nose.tools.eq_, a.dtype, np.int8
+        yield nose.tools.eq_, a.tolist(), [i - ir._start for i in L]
+        yield nose.tools.eq_, np.array(ir, dtype=float).tolist(), L
+    ir = lrange(3)
+    yield nose.tools.eq_, ir.__array__(copy=True).tolist(), [0, 1, 2]
+    yield nose.tools.assert_raises, ValueError, ir.__array__, None, False
+    if int(np.__version__.split('.')[0]) >= 2:
+        yield (nose.tools.assert_raises, ValueError,
+               lambda: np.array(ir, copy=False))
+        yield nose.tools.eq_, np.asarray(ir, copy=True).tolist(), [0, 1, 2]
+
+
+@skipif(nonumpy)
+def test_to_numpy_big():
+    import numpy as np
+    I64 = 2**63
+    for args, dtype in [((I64-3, I64), np.int64),
+                        ((-I64, -I64+2**64, 2**62), np.int64),
+                        ((I64+3, I64-3, -2), np.uint64),
+                        ((2**64-1, 2**64-10, -4), np.uint64),
+                        ((-I64-1, -I64+1), object),
+                        ((BIGINT, BIGINT+10, 3), object)]:
+        ir = lrange(*args)
+        a = ir.to_numpy()
+        yield nose.tools.eq_, a.dtype, dtype
+        yield nose.tools.eq_, a.tolist(), list(range(*args))
+
+    ir = lrange(BIGINT, BIGINT+10, 3)
+    a = ir.to_numpy(offset=True)
+    yield nose.tools.eq_, a.dtype, np.int64
+    yield nose.tools.eq_, a.tolist(), [0, 3, 6, 9]
+    yield nose.tools.assert_raises, OverflowError, ir.to_numpy, np.int64
+    yield nose.tools.assert_raises, OverflowError, lrange(300).to_numpy, 'u1'
+    yield nose.tools.eq_, lrange(-5).to_numpy().tolist(), []
+    yield nose.tools.assert_raises, OverflowError, lrange(BIGINT).to_numpy
+
+
+def test_chunks():
+    for args in _get_short_lranges_args():
+        ir, L = lrange(*args), list(range(*args))
+        for size in [1, 2, 7, 100]:
+            blocks = list(ir.chunks(size))
+            yield nose.tools.ok_, all(isinstance(b, lrange) for b in blocks)
+            yield nose.tools.ok_, all(b.length == size for b in blocks[:-1])
+            yield nose.tools.eq_, sum([list(b) for b in blocks], []), L
+            yield (nose.tools.eq_, list(ir.chunks(size, 'list')),
+                   [list(b) for b in blocks])
+
+
+def test_chunks_big():
+    N = 10**100
+    ir = lrange(N, -N, -N//3)
+    blocks = list(ir.chunks(4))
+    yield nose.tools.eq_, [b.length for b in blocks], [4, 2]
+    yield (nose.tools.eq_, sum([list(b) for b in blocks], []),
+           list(range(N, -N, -N//3)))
+    first = next(lrange(BIGINT).chunks(10, 'list'))
+    yield nose.tools.eq_, first, list(range(10))
+    yield nose.tools.assert_raises, ValueError, lrange(10).chunks, 0
+    yield nose.tools.assert_raises, ValueError, lrange(10).chunks, 1, 'tuple'
+    yield nose.tools.assert_raises, TypeError, lrange(10).chunks, 1.5
+
+
+@skipif(nonumpy)
+def test_chunks_numpy():
+    ir = lrange(-3, 50, 4)
+    blocks = [a.tolist() for a in ir.chunks(5, 'numpy')]
+    yield nose.tools.eq_, blocks, list(ir.chunks(5, 'list'))
+
+
+def test_split_shard():
+    for args in _get_short_lranges_args():
+        ir, L = lrange(*args), list(range(*args))
+        for k in [1, 2, 3, 7, 100]:
+            pieces = ir.split(k)
+            lengths = [p.length for p in pieces]
+            yield nose.tools.eq_, len(pieces), k
+            yield nose.tools.ok_, max(lengths) - min(lengths) <= 1, lengths
+            yield nose.tools.eq_, sum([list(p) for p in pieces], []), L
+            shards = [ir.shard(i, k) for i in range(k)]
+            yield (nose.tools.eq_, sorted(sum([list(s) for s in shards], [])),
+                   sorted(L))
+            yield nose.tools.eq_, [list(s) for s in shards], \
+                  [L[i::k] for i in range(k)]
+
+
+def test_split_shard_big():
+    N = 10**100
+    ir = lrange(N, -N, -7)
+    pieces = ir.split(3)
+    yield (nose.tools.eq_, sum([p.length for p in pieces]), ir.length)
+    yield nose.tools.eq_, pieces[0][0], ir[0]
+    yield nose.tools.eq_, pieces[-1][-1], ir[-1]
+    for a, b in zip(pieces, pieces[1:]):
+        yield nose.tools.eq_, a[-1] - 7, b[0]
+    shards = [ir.shard(i, 5) for i in range(5)]
+    yield (nose.tools.eq_, sum([s.length for s in shards]), ir.length)
+    yield nose.tools.eq_, [s[0] for s in shards], [ir[i] for i in range(5)]
+    yield nose.tools.assert_raises, ValueError, ir.split, 0
+    yield nose.tools.assert_raises, ValueError, ir.shard, 0, 0
+    yield nose.tools.assert_raises, IndexError, ir.shard, 5, 5
+    yield nose.tools.assert_raises, IndexError, ir.shard, -1, 5
+
+
+def test_intersection():
+    all_args = _get_short_lranges_args() + [[-40, 90, 6], [90, -40, -4],
+                                            [7, 8, 100], [0, 200, 15]]
+    for args in all_args:
+        a = lrange(*args)
+        A = list(a)
+        for other in all_args:
+            b = lrange(*other)
+            B = list(b)
+            common = [i for i in A if i in B]
+            yield nose.tools.eq_, list(a & b), common, (a, b)
+            yield nose.tools.eq_, list(a.intersection(b)), common, (a, b)
+            yield nose.tools.eq_, a.isdisjoint(b), not common, (a, b)
+            yield nose.tools.eq_, a.issubset(b), common == A, (a, b)
+            yield nose.tools.eq_, b.issuperset(a), common == A, (a, b)
+
+
+def test_intersection_big():
+    N = 10**100
+    r = lrange(-N, N, 11) & lrange(3, N, 7)
+    yield nose.tools.eq_, r._step, 77
+    yield nose.tools.ok_, r[0] in lrange(-N, N, 11)
+    yield nose.tools.eq_, r[0] % 7, 3
+    yield nose.tools.ok_, r[0] - 77 < 3
+    yield nose.tools.ok_, lrange(N, 2*N, 4).issubset(lrange(0, 3*N, 2))
+    yield nose.tools.ok_, not lrange(N, 2*N, 2).issubset(lrange(0, 3*N, 4))
+    yield nose.tools.ok_, lrange(1, N, 2).isdisjoint(lrange(0, N, 2))
+    yield nose.tools.assert_raises, TypeError, lrange(3).intersection, [1]
+    yield nose.tools.assert_raises, TypeError, lambda: lrange(3) & set([1])
+    yield nose.tools.assert_raises, TypeError, lrange(3).issubset, [1]
+    yield nose.tools.assert_raises, TypeError, lrange(3).issuperset, [1]
+
+
+def test_iterator():
+    for r in _get_lranges():
+        if r.length > LENGTH_CUTOFF: continue # skip long
+        L = list(r)
+        yield nose.tools.eq_, list(r.iterator()), L
+        for index in [0, 1, 3, -1, -2]:
+            if not -len(L) <= index <= len(L):
+                continue
+            it = r.iterator(index)
+            yield nose.tools.eq_, it.__length_hint__(), len(L[index:])
+            yield nose.tools.eq_, list(it), L[index:]
+            yield nose.tools.eq_, it.__length_hint__(), 0
+
+
+def test_iterator_big():
+    it = lrange(BIGINT).iterator()
+    it.seek(10**60)
+    yield nose.tools.eq_, next(it), 10**60
+    yield nose.tools.eq_, it.position, 10**60 + 1
+    yield nose.tools.eq_, it.__length_hint__(), BIGINT - 10**60 - 1
+    for proto in range(pickle.HIGHEST_PROTOCOL + 1):
+        it2 = pickle.loads(pickle.dumps(it, proto))
+        yield nose.tools.eq_, next(it2), 10**60 + 1
+    it3 = lrange_iterator.from_token(it.token())
+    yield nose.tools.eq_, [next(it3), next(it)], [10**60 + 1] * 2
+    it.seek(-1)
+    yield nose.tools.eq_, list(it), [BIGINT - 1]
+    it4 = lrange(-10, -BIGINT, -7).iterator(-2)
+    it4 = lrange_iterator.from_token(it4.token())
+    yield nose.tools.eq_, list(it4), list(lrange(-10, -BIGINT, -7)[-2:])
+    yield nose.tools.assert_raises, IndexError, it.seek, BIGINT + 1
+    yield nose.tools.assert_raises, IndexError, it.seek, -BIGINT - 1
+    for token in ['1:2', '0:a:0:0', '0:a:1:ff', '0:a:1:-b']:
+        yield (nose.tools.ok_, 'invalid lrange_iterator token' in
+               _token_error(lrange_iterator, token), token)
+    yield nose.tools.assert_raises, TypeError, lrange_iterator, range(3)
+
+
+def _get_rangesets():
+    spans = [lrange(0, 5), lrange(3, 9), lrange(12, 15), 20, 21, lrange(40, 30),
+             lrange(-10, -3), lrange(30, 25, -1), lrange(7, 13), 9, 100]
+    return [RangeSet(spans[i:i+k]) for i in range(len(spans))
+            for k in range(0, 5)]
+
+
+def test_rangeset():
+    for s in _get_rangesets():
+        items = set()
+        for span in s.spans():
+            items.update(span)
+        spans = s.spans()
+        yield nose.tools.eq_, list(s), sorted(items)
+        yield nose.tools.eq_, len(s), len(items)
+        yield nose.tools.eq_, bool(s), bool(items)
+        yield nose.tools.ok_, all(a._stop < b._start
+                                  for a, b in zip(spans, spans[1:])), spans
+        for i in range(-15, 110):
+            yield nose.tools.eq_, i in s, i in items
+
+
+def test_rangeset_ops():
+    bounds = lrange(-20, 120)
+    for a in _get_rangesets():
+        A = set(a)
+        yield nose.tools.eq_, set(a.complement(bounds)), set(bounds) - A
+        for b in _get_rangesets()[::7]:
+            B = set(b)
+            yield nose.tools.eq_, set(a | b), A | B
+            yield nose.tools.eq_, set(a & b), A & B
+            yield nose.tools.eq_, set(a - b), A - B
+            yield nose.tools.eq_, a | b, b | a
+            s = a.copy()
+            for span in b.spans():
+                s.remove(span)
+            yield nose.tools.eq_, s, a - b
+            yield nose.tools.eq_, a != b, A != B
+        yield nose.tools.eq_, eval(repr(a)), a
+    a = RangeSet([lrange(3), lrange(5, 7)])
+    s = a.copy()
+    s.remove(lrange(4, 2))
+    yield nose.tools.eq_, s, a
+    yield nose.tools.ok_, _EqualsOne() in a and 'a' not in a
+    yield nose.tools.ok_, 2.0 in a and 2.5 not in a and 4.0 not in a
+    yield nose.tools.ok_, 0.0 not in RangeSet() and 'a' not in RangeSet()
+    yield nose.tools.ok_, a != set(a) and not a == set(a)
+    for op in ['__or__', '__and__', '__sub__']:
+        yield nose.tools.eq_, getattr(a, op)(set(a)), NotImplemented
+
+
+def test_rangeset_big():
+    N = 10**100
+    s = RangeSet([lrange(N, 2*N), lrange(-N, 0), lrange(0, 1)])
+    yield nose.tools.eq_, s.spans(), [lrange(-N, 1), lrange(N, 2*N)]
+    yield nose.tools.eq_, s.length, 2*N + 1
+    yield nose.tools.assert_raises, OverflowError, len, s
+    yield nose.tools.ok_, N + 5 in s
+    yield nose.tools.ok_, 2*N not in s
+    yield nose.tools.assert_raises, ValueError, s.add, lrange(0, 10, 2)
+    yield nose.tools.assert_raises, TypeError, s.add, 1.5
+    yield nose.tools.assert_raises, TypeError, hash, s
+
+
+
+def _random_lranges(n, seed=0):
+    rnd = random.Random(seed)
+    ranges = []
+    for _ in range(n):
+        start = rnd.randint(-200, 200)
+        stop = start + rnd.randint(-50, 50)
+        step = rnd.choice([1, 2, 3, 7, -1, -2, -5])
+        ranges.append(lrange(start, stop, step))
+    return ranges
+
+
+def test_lrange_index():
+    ranges = _random_lranges(300)
+    index = LRangeIndex(ranges[:200])
+    live = ranges[:200]
+    for r in ranges[200:]:
+        index.insert(r)
+        live.append(r)
+    for r in ranges[::3]:
+        index.delete(r)
+        live.remove(r)
+    yield nose.tools.eq_, len(index), len(live)
+    yield (nose.tools.eq_, sorted([list(r) for r in index]),
+           sorted([list(r) for r in live]))
+    for x in range(-260, 260, 3):
+        yield (nose.tools.eq_, sorted(map(repr, index.stab(x))),
+               sorted([repr(r) for r in live if x in r]))
+    for q in _random_lranges(30, seed=1):
+        yield (nose.tools.eq_, sorted(map(repr, index.overlap(q))),
+               sorted([repr(r) for r in live if not r.isdisjoint(q)]))
+    yield (nose.tools.eq_, index.stab_many([0, 5]),
+           [index.stab(0), index.stab(5)])
+
+
+def test_lrange_index_inserts():
+    # built by inserts only: the ranges are spread over many trees
+    ranges = _random_lranges(500, seed=2)
+    index = LRangeIndex()
+    for r in ranges:
+        index.insert(r)
+    yield nose.tools.eq_, len(index), len(ranges)
+    for x in range(-260, 260, 7):
+        hits = index.stab(x)
+        yield nose.tools.eq_, sorted(map(repr, hits)), sorted(
+            [repr(r) for r in ranges if x in r])
+        lows = [r.min() for r in hits]
+        yield nose.tools.eq_, lows, sorted(lows)
+
+
+def test_lrange_index_big():
+    N = 10**100
+    index = LRangeIndex([lrange(0, 3*N, 3), lrange(N, -N, -1), lrange(2*N, 4*N)])
+    yield nose.tools.eq_, index.stab(2*N + 2), [lrange(2*N, 4*N)]
+    yield (nose.tools.eq_, index.stab(3),
+           [lrange(N, -N, -1), lrange(0, 3*N, 3)])
+    yield nose.tools.eq_, index.overlap(lrange(-5, -3)), [lrange(N, -N, -1)]
+    yield nose.tools.assert_raises, ValueError, index.delete, lrange(5)
+    yield nose.tools.assert_raises, TypeError, index.insert, range(5)
+    yield nose.tools.assert_raises, TypeError, index.stab, 1.5
+
+
+def test_aggregates():
+    for args in _get_short_lranges_args() + [[5, 6, 100], [5, 4, -100]]:
+        ir, L = lrange(*args), list(range(*args))
+        n = len(L)
+        yield nose.tools.eq_, ir.sum(), sum(L)
+        if not L:
+            for method in [ir.min, ir.max, ir.mean, ir.median, ir.pvariance,
+                           ir.variance]:
+                yield nose.tools.assert_raises, ValueError, method
+            yield nose.tools.assert_raises, ValueError, ir.quantile, 0.5
+            continue
+        S = sorted(L)
+        mean = Fraction(sum(L), n)
+        median = (Fraction(S[(n - 1) // 2]) + S[n // 2]) / 2
+        pvariance = sum([(x - mean)**2 for x in L]) / n
+        yield nose.tools.eq_, ir.min(), min(L)
+        yield nose.tools.eq_, ir.max(), max(L)
+        yield nose.tools.eq_, ir.mean(), mean
+        yield nose.tools.eq_, ir.median(), median
+        yield nose.tools.eq_, ir.pvariance(), pvariance
+        if n > 1:
+            yield nose.tools.eq_, ir.variance(), pvariance * n / (n - 1)
+        yield nose.tools.eq_, ir.quantile(0), S[0]
+        yield nose.tools.eq_, ir.quantile(1), S[-1]
+        yield nose.tools.eq_, ir.quantile(Fraction(1, 2)), median
+        yield nose.tools.eq_, ir.quantile(0.25), S[0] + (S[-1] - S[0]) * Fraction(1, 4)
+        yield nose.tools.assert_raises, ValueError, ir.quantile, 1.5
+
+
+def test_aggregates_big():
+    r = lrange(BIGINT)
+    yield nose.tools.eq_, r.sum(), BIGINT * (BIGINT - 1) // 2
+    yield nose.tools.eq_, type(r.sum()), type(BIGINT)
+    yield nose.tools.eq_, r.max(), BIGINT - 1
+    yield nose.tools.eq_, r.mean(), Fraction(BIGINT - 1, 2)
+    yield nose.tools.eq_, r.variance(), Fraction(BIGINT * (BIGINT + 1), 12)
+    yield nose.tools.eq_, lrange(BIGINT, -BIGINT-1, -2).median(), 0
+    yield nose.tools.eq_, type(lrange(3).mean()), int
+
+
+def test_affine():
+    for args in _get_short_lranges_args():
+        ir, L = lrange(*args), list(range(*args))
+        for k in [1, -1, 2, -3, 7]:
+            yield nose.tools.eq_, list(ir + k), [i + k for i in L]
+            yield nose.tools.eq_, list(k + ir), [k + i for i in L]
+            yield nose.tools.eq_, list(ir - k), [i - k for i in L]
+            yield nose.tools.eq_, list(k - ir), [k - i for i in L]
+            yield nose.tools.eq_, list(ir * k), [i * k for i in L]
+            yield nose.tools.eq_, list(k * ir), [k * i for i in L]
+            if len(L) <= 1 or ir._step % k == 0:
+                yield nose.tools.eq_, list(ir // k), [i // k for i in L]
+            else:
+                yield nose.tools.assert_raises, ValueError, ir.__floordiv__, k
+        yield nose.tools.eq_, list(-ir), [-i for i in L]
+
+
+def test_affine_big():
+    r = lrange(BIGINT, 3*BIGINT, 7)
+    yield nose.tools.eq_, (r * BIGINT).length, r.length
+    yield nose.tools.eq_, (r * BIGINT)[5], r[5] * BIGINT
+    yield nose.tools.eq_, (r + BIGINT)[-1], r[-1] + BIGINT
+    yield nose.tools.ok_, -BIGINT in -r
+    yield nose.tools.eq_, (r * 21 // 3)[-1], r[-1] * 7
+    yield nose.tools.assert_raises, ValueError, r.__mul__, 0
+    yield nose.tools.assert_raises, ZeroDivisionError, r.__floordiv__, 0
+    yield nose.tools.assert_raises, ValueError, r.__floordiv__, 2
+    yield nose.tools.assert_raises, TypeError, lambda: r + 1.5
+    yield nose.tools.assert_raises, TypeError, lambda: r - 1.5
+    yield nose.tools.assert_raises, TypeError, lambda: 1.5 - r
+    yield nose.tools.assert_raises, TypeError, lambda: r // 1.5
+    yield nose.tools.assert_raises, TypeError, lambda: r * r
+
+
+def test_permuted():
+    for args in _get_short_lranges_args():
+        ir, L = lrange(*args), list(range(*args))
+        for seed in [0, 1, 12345]:
+            P = list(ir.permuted(seed))
+            yield nose.tools.eq_, sorted(P), sorted(L)
+            yield nose.tools.eq_, list(ir.permuted(seed)), P
+            if len(L) >= 2:
+                yield nose.tools.eq_, list(ir.permuted(seed, 2)), P[2:]
+            yield nose.tools.eq_, ir.sample(min(3, len(L)), seed), P[:3]
+    L = list(lrange(100).permuted(0))
+    yield nose.tools.ok_, L != list(range(100))
+    yield nose.tools.ok_, L != list(lrange(100).permuted(1))
+    # the round function is not affine even for 1-bit halves
+    orders = set([tuple(lrange(4).permuted(seed)) for seed in range(2000)])
+    yield nose.tools.eq_, len(orders), 24
+
+
+def _token_error(cls, token):
+    """Return message of ValueError raised by cls.from_token(token)."""
+    try:
+        cls.from_token(token)
+    except ValueError:
+        return str(sys.exc_info()[1])
+    assert 0, token
+
+
+def test_permuted_big():
+    r = lrange(-BIGINT, BIGINT, 3)
+    it = r.permuted()
+    first = [next(it) for _ in range(10)]
+    yield nose.tools.ok_, all(i in r for i in first)
+    yield nose.tools.eq_, len(set(first)), 10
+    yield nose.tools.eq_, it.__length_hint__(), r.length - 10
+    it2 = lrange_permutation.from_token(it.token())
+    for token in ['1:2', 'a:b:c:d:x', None, '0:a:0:1:0', '0:a:1:1:ff']:
+        yield (nose.tools.ok_, 'invalid lrange_permutation token' in
+               _token_error(lrange_permutation, token), token)
+    for proto in range(pickle.HIGHEST_PROTOCOL + 1):
+        it3 = pickle.loads(pickle.dumps(it, proto))
+        yield nose.tools.eq_, next(it3), next(it2)
+        it2.seek(10)
+    it.seek(0)
+    yield nose.tools.eq_, [next(it) for _ in range(10)], first
+    yield nose.tools.eq_, r.sample(10, it.seed), first
+    yield nose.tools.ok_, r.choice() in r
+    yield nose.tools.eq_, r.choice(seed=5), r.choice(seed=5)
+    yield nose.tools.assert_raises, ValueError, r.sample, -1
+    yield nose.tools.assert_raises, ValueError, lrange(3).sample, 4
+    yield nose.tools.assert_raises, IndexError, lrange(0).choice
+    yield nose.tools.assert_raises, TypeError, r.permuted, 1.5
+
+
+def test_map_views():
+    f = lambda i: i * 3 + 1
+    for args in _get_short_lranges_args():
+        ir, L = lrange(*args), list(range(*args))
+        m = ir.map(f)
+        M = [f(i) for i in L]
+        yield nose.tools.eq_, len(m), len(M)
+        yield nose.tools.eq_, list(m), M
+        yield nose.tools.eq_, bool(m), bool(M)
+        yield nose.tools.eq_, list(reversed(m)), M[::-1]
+        yield nose.tools.eq_, [m[i] for i in range(-len(M), len(M))], M + M
+        for s in _get_slices():
+            yield nose.tools.eq_, list(m[s]), M[s]
+        E = list(enumerate(L, 5))
+        yield nose.tools.eq_, list(ir.enumerate(5)), E
+        yield nose.tools.eq_, list(ir.enumerate(5)[::-2]), E[::-2]
+        other = lrange(100, -100, -3)
+        Z = list(zip(L, other))
+        yield nose.tools.eq_, list(ir.zip(other)), Z
+        yield nose.tools.eq_, list(ir.zip(other)[-3:]), Z[-3:]
+        for residue, modulus in [(0, 1), (1, 2), (-1, 3), (5, 7)]:
+            yield (nose.tools.eq_, list(ir.where(residue, modulus)),
+                   [i for i in L if i % modulus == residue % modulus])
+
+
+def test_map_views_big():
+    calls = []
+    def f(i):
+        calls.append(i)
+        return -i
+    m = lrange(BIGINT).map(f)
+    yield nose.tools.eq_, m.length, BIGINT
+    yield nose.tools.eq_, m[-1], 1 - BIGINT
+    yield nose.tools.eq_, m[10**100:][0], -10**100
+    yield nose.tools.eq_, calls, [BIGINT - 1, 10**100]
+    yield nose.tools.assert_raises, OverflowError, len, m
+    e = lrange(BIGINT).enumerate()
+    yield nose.tools.eq_, e[-1], (BIGINT - 1, BIGINT - 1)
+    w = lrange(BIGINT, 0, -1).where(3, 7)
+    yield nose.tools.eq_, w._step, -7
+    yield nose.tools.eq_, w[0] % 7, 3
+    yield nose.tools.assert_raises, ValueError, lrange(5).where, 1, 0
+    yield nose.tools.assert_raises, TypeError, lrange_map, f
+    yield nose.tools.assert_raises, TypeError, lrange_map, f, [1, 2]
+    yield (nose.tools.eq_, repr(lrange_map(abs, lrange(3), lrange(1, 9))),
+           'lrange_map(%r, lrange(0, 3), lrange(1, 4))' % (abs,))
+
+
+def _tolist(a):
+    """Convert NumPy array or list `a` to a list."""
+    return getattr(a, 'tolist', lambda: list(a))()
+
+
+def _searchsorted(L, v, side):
+    """Index where `v` would be inserted into ordered list `L`."""
+    if len(L) > 1 and L[0] > L[-1]: # descending
+        L, v = [-i for i in L], -v
+    if side == 'left':
+        return len([i for i in L if i < v])
+    return len([i for i in L if i <= v])
+
+
+def test_contains_many_searchsorted():
+    import array
+    values = list(range(-110, 110, 3))
+    for N in [0, 2**62, BIGINT]:
+        for args in _get_short_lranges_args():
+            if len(args) == 1:
+                args = [0] + args
+            args = [a + N for a in args[:2]] + args[2:]
+            ir, L = lrange(*args), list(range(*args))
+            V = [v + N for v in values]
+            yield (nose.tools.eq_, _tolist(ir.contains_many(V)),
+                   [v in L for v in V])
+            for side in ['left', 'right']:
+                yield (nose.tools.eq_, _tolist(ir.searchsorted(V, side)),
+                       [_searchsorted(L, v, side) for v in V])
+    ir = lrange(-50, 50, 7)
+    L = list(ir)
+    V = array.array('i', values)
+    yield nose.tools.eq_, _tolist(ir.contains_many(V)), [v in L for v in V]
+    V = [2.5, 0.0, -8.0, float('inf'), -1e300]
+    yield nose.tools.eq_, _tolist(ir.contains_many(V)), [v in L for v in V]
+    yield (nose.tools.eq_, _tolist(ir.searchsorted(V, 'right')),
+           [_searchsorted(L, v, 'right') for v in V])
+    yield nose.tools.assert_raises, ValueError, ir.searchsorted, [1], 'middle'
+    yield (nose.tools.assert_raises, ValueError, ir.searchsorted,
+           [float('nan')])
+    yield nose.tools.assert_raises, TypeError, ir.searchsorted, ['a']
+    yield nose.tools.eq_, _tolist(lrange(0).searchsorted([2.5, 3])), [0, 0]
+
+
+@skipif(nonumpy)
+def test_contains_many_searchsorted_numpy():
+    import numpy as np
+    ir = lrange(-2**63, 2**64, 2**40 + 1)
+    V = np.array([[-2**63, 0], [2**40 + 1 - 2**63, 5]], dtype=np.int64)
+    mask = ir.contains_many(V)
+    yield nose.tools.eq_, mask.shape, (2, 2)
+    yield nose.tools.eq_, mask.tolist(), [[True, False], [True, False]]
+    pos = ir.searchsorted(np.array([2**64 - 1, 0], dtype=np.uint64))
+    yield nose.tools.eq_, pos.dtype, np.int64
+    yield (nose.tools.eq_, pos.tolist(),
+           [ir.searchsorted([2**64 - 1])[0], ir.searchsorted([0])[0]])
+    yield nose.tools.eq_, pos[0], ir.length
+    yield nose.tools.eq_, lrange(BIGINT).searchsorted([BIGINT]).dtype, object
+    # NumPy would convert these ints to float64 losing precision
+    mixed = [-1, 2**63 + 1]
+    yield (nose.tools.eq_, lrange(0, 2**64, 2).contains_many(mixed).tolist(),
+           [False, False])
+    yield (nose.tools.eq_, lrange(2**64).searchsorted(mixed).tolist(),
+           [0, 2**63 + 1])
+
+
+def _take(L, indices, mode):
+    n = len(L)
+    if mode == 'wrap':
+        indices = [i % n for i in indices]
+    elif mode == 'clip':
+        indices = [min(max(i, 0), n - 1) for i in indices]
+    return [L[i] for i in indices]
+
+
+def test_take():
+    indices = [0, 1, -1, 5, -7, 2**62, -2**65, BIGINT]
+    for N in [0, 2**62, BIGINT]:
+        for args in _get_short_lranges_args():
+            if len(args) == 1:
+                args = [0] + args
+            args = [a + N for a in args[:2]] + args[2:]
+            ir, L = lrange(*args), list(range(*args))
+            inrange = [i for i in indices if -len(L) <= i < len(L)]
+            yield nose.tools.eq_, _tolist(ir.take(inrange)), _take(L, inrange,
+                                                                   'raise')
+            yield nose.tools.eq_, _tolist(ir.take([])), []
+            if not L:
+                for mode in ['raise', 'wrap', 'clip']:
+                    yield (nose.tools.assert_raises, IndexError, ir.take, [0],
+                           mode)
+                continue
+            for mode in ['wrap', 'clip']:
+                yield (nose.tools.eq_, _tolist(ir.take(indices, mode)),
+                       _take(L, indices, mode))
+            yield nose.tools.assert_raises, IndexError, ir.take, [len(L)]
+            yield nose.tools.assert_raises, IndexError, ir.take, [-len(L) - 1]
+    yield nose.tools.assert_raises, ValueError, lrange(3).take, [0], 'ignore'
+    yield nose.tools.eq_, _tolist(lrange(BIGINT).take([-1])), [BIGINT - 1]
+    for indices in [[1, 2.5], [1.0], [0.5, 2**70], ['a']]:
+        yield nose.tools.assert_raises, TypeError, lrange(10).take, indices
+
+
+@skipif(nonumpy)
+def test_take_numpy():
+    import numpy as np
+    ir = lrange(2**63, 2**64, 2**40 + 1)
+    idx = np.array([[0, 1], [-1, 3]], dtype=np.int16)
+    a = ir.take(idx)
+    yield nose.tools.eq_, a.shape, (2, 2)
+    yield nose.tools.eq_, a.dtype, np.uint64
+    yield nose.tools.eq_, a.tolist(), [[ir[0], ir[1]], [ir[-1], ir[3]]]
+    a = lrange(-5, 5).take(np.array([0, 9], dtype=np.uint64))
+    yield nose.tools.eq_, (a.dtype, a.tolist()), (np.int64, [-5, 4])
+    a = lrange(BIGINT, 0, -3).take(np.array([1, -1]))
+    yield nose.tools.eq_, a.dtype, object
+    yield nose.tools.eq_, a.tolist(), [BIGINT - 3, lrange(BIGINT, 0, -3)[-1]]
+    yield nose.tools.assert_raises, TypeError, ir.take, np.array([1.0])
+    # NumPy would convert these ints to float64
+    ir = lrange(0, 10**40, 10**20)
+    yield (nose.tools.eq_, ir.take([0, -1, 10**19]).tolist(),
+           [0, ir[-1], 10**39])
+
+
+def test_to_file_from_buffer():
+    import io
+    for args in [(0,), (5,), (-3, 10**5, 7), (2**31 - 1, -2**31, -2**20),
+                 (2**63 - 1, -2**63, -2**60), (0, 2**64, 2**62)]:
+        ir = lrange(*args)
+        for dtype in ['int32', 'uint32', 'int64', 'uint64']:
+            for byteorder in [None, 'little', 'big']:
+                f = io.BytesIO()
+                try:
+                    ir.to_file(f, dtype, byteorder)
+                except OverflowError:
+                    bits = int(dtype[-2:])
+                    lo, hi = 0, 2**bits - 1
+                    if dtype.startswith('int'):
+                        lo, hi = -2**(bits - 1), 2**(bits - 1) - 1
+                    yield nose.tools.ok_, not lo <= ir.min() <= ir.max() <= hi
+                    continue
+                b = f.getvalue()
+                yield nose.tools.eq_, b, _pack(list(ir), dtype, byteorder)
+                yield (nose.tools.eq_, lrange.from_buffer(b, dtype, byteorder),
+                       ir)
+    yield nose.tools.assert_raises, OverflowError, lrange(-1, 1).to_file, \
+          io.BytesIO(), 'uint8'
+    yield nose.tools.assert_raises, TypeError, lrange(3).to_file, \
+          io.BytesIO(), 'float64'
+    yield nose.tools.assert_raises, ValueError, lrange(3).to_file, \
+          io.BytesIO(), 'int8', 'middle'
+    for b in [b'\x01\x02\x04', b'\x07\x07', b'\x00\x01\x02\x00']:
+        yield nose.tools.assert_raises, ValueError, lrange.from_buffer, b, \
+              'uint8'
+    yield (nose.tools.assert_raises, ValueError, lrange.from_buffer,
+           b'\x00' * 3, 'int16')
+    # 0, 200 starts a progression whose next item 400 overflows uint8
+    yield (nose.tools.assert_raises, ValueError, lrange.from_buffer,
+           b'\x00\xc8\x90', 'uint8')
+    # 0, 100, 200 is a progression but 300 would not fit into uint8
+    yield nose.tools.eq_, lrange.from_buffer(b'\x00\x64\xc8', 'uint8'), \
+          lrange(0, 300, 100)
+
+
+def _pack(L, dtype, byteorder):
+    import struct
+    code = dict(int32='i', uint32='I', int64='q', uint64='Q')[dtype]
+    order = {None: '=', 'little': '<', 'big': '>'}[byteorder]
+    return struct.pack(order + '%d' % len(L) + code, *L)
+
+
+def test_to_mmap():
+    import os, shutil, tempfile
+    tmpdir = tempfile.mkdtemp()
+    try:
+        path = os.path.join(tmpdir, 'r.bin')
+        ir = lrange(10**6, -10**6, -3)
+        mm = ir.to_mmap(path, 'int32', 'big')
+        try:
+            yield nose.tools.eq_, len(mm), 4 * len(ir)
+            yield nose.tools.eq_, lrange.from_buffer(mm, 'int32', 'big'), ir
+        finally:
+            mm.close()
+        f = open(path, 'rb')
+        try:
+            yield nose.tools.eq_, f.read(), _pack(list(ir), 'int32', 'big')
+        finally:
+            f.close()
+        ir = lrange(0, 10**6, 7)
+        ir.to_file(path, 'uint64', 'little')
+        f = open(path, 'rb')
+        try:
+            yield nose.tools.eq_, f.read(), _pack(list(ir), 'uint64', 'little')
+        finally:
+            f.close()
+        yield nose.tools.assert_raises, ValueError, lrange(0).to_mmap, path
+        yield (nose.tools.assert_raises, OverflowError, lrange(2**63).to_mmap,
+               path)
+        # too large to map, too large for the file system: no file is left
+        os.remove(path)
+        for r, exc in [(lrange(0, 2**62), OverflowError),
+                       (lrange(2**59), EnvironmentError)]:
+            yield nose.tools.assert_raises, exc, r.to_mmap, path
+            yield nose.tools.ok_, not os.path.exists(path)
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+@skipif(nonumpy)
+def test_from_buffer_numpy():
+    import numpy as np
+    ir = lrange(-2**40, 2**40, 2**33 + 5)
+    a = ir.to_numpy()
+    yield nose.tools.eq_, lrange.from_buffer(a, np.int64), ir
+    yield nose.tools.eq_, lrange.from_buffer(a.astype('>i8'), 'int64', 'big'), ir
+
+
+try:
+    StopAsyncIteration
+except NameError: # Python < 3.5
+    StopAsyncIteration = StopIteration
+
+
+def _adrain(ait):
+    """Return (items, suspensions count) driving async iterator `ait`."""
+    items, suspensions = [], 0
+    while True:
+        try:
+            aw = ait.__anext__()
+        except StopAsyncIteration:
+            return items, suspensions
+        it = aw.__await__()
+        while True:
+            try:
+                x = next(it)
+            except StopIteration:
+                e = sys.exc_info()[1]
+                items.append(e.args[0])
+                break
+            assert x is None
+            suspensions += 1
+
+
+def test_aiter():
+    for args in [(0,), (10,), (BIGINT, BIGINT + 100, 3), (5, -20, -7)]:
+        ir = lrange(*args)
+        L = list(ir)
+        yield nose.tools.eq_, _adrain(ir.__aiter__())[0], L
+        it = ir.aiter()
+        yield nose.tools.ok_, it.__aiter__() is it
+        for every in [1, 3, 1000]:
+            yield (nose.tools.eq_, _adrain(ir.aiter(every=every)),
+                   (L, len(L) // every))
+        items, _ = _adrain(ir.aiter(batch=4))
+        yield nose.tools.eq_, [list(b) for b in items], [L[i:i + 4] for i in
+                                                        range(0, len(L), 4)]
+        yield nose.tools.eq_, _adrain(ir.aiter(every=10**9, interval=0)), \
+              (L, len(L))
+    yield nose.tools.assert_raises, ValueError, lrange(3).aiter, None, 0
+    yield nose.tools.assert_raises, ValueError, lrange(3).aiter, 0
+
+
+def test_stats():
+    original = lrange.__dict__['__contains__']
+    events = []
+    lrange.reset_stats()
+    lrange.enable_stats(lambda *args: events.append(args))
+    try:
+        wrapped = lrange.__dict__['__contains__']
+        r = lrange(BIGINT, BIGINT + 5)
+        'a' in r
+        5 in r
+        r[2]
+        r.index(BIGINT + 1)
+        index_kwargs = r.index(BIGINT + 1, stop=3)
+        lrange(3).index(_EqualsOne())
+        lrange(3).count(_EqualsOne())
+        try:
+            len(lrange(BIGINT))
+        except OverflowError:
+            pass
+        list(r)
+    finally:
+        lrange.disable_stats()
+    stats = lrange.stats()
+    yield nose.tools.ok_, wrapped is not original
+    yield nose.tools.ok_, lrange.__dict__['__contains__'] is original
+    yield nose.tools.eq_, stats[('contains', 'scan')][0], 1
+    yield nose.tools.ok_, stats[('contains', 'fast')][0] >= 1
+    yield nose.tools.eq_, stats[('len', 'overflow')][0], 1
+    # r[2] and the slice that the index() scan iterates
+    yield nose.tools.eq_, stats[('getitem', 'fast')][0], 2
+    yield nose.tools.eq_, index_kwargs, 1
+    yield nose.tools.eq_, stats[('index', 'fast')][0], 2
+    yield nose.tools.eq_, stats[('index', 'scan')][0], 1
+    yield nose.tools.eq_, stats[('count', 'scan')][0], 1
+    yield nose.tools.ok_, ('count', 'fast') not in stats
+    if sys.version_info[0] < 3:
+        # list(r) and the linear scan in `'a' in r`
+        yield nose.tools.eq_, stats[('iter', 'fallback')][0], 2
+    yield nose.tools.ok_, all(t >= 0 for _, t in stats.values())
+    yield nose.tools.eq_, len(events), sum(n for n, _ in stats.values())
+    yield nose.tools.ok_, ('contains', 'scan') in [e[:2] for e in events]
+    5 in lrange(3) # not counted while disabled
+    yield nose.tools.eq_, lrange.stats(), stats
+    lrange.reset_stats()
+    yield nose.tools.eq_, lrange.stats(), {}
+
+
+def test_ndrange():
+    import itertools
+    axes = [lrange(3), lrange(10, 0, -4), lrange(-5, 5, 7), lrange(0)]
+    for ndim in range(4):
+        for rs in itertools.permutations(axes, ndim):
+            nd = ndrange(*rs)
+            L = list(itertools.product(*[list(r) for r in rs]))
+            yield nose.tools.eq_, (len(nd), nd.length), (len(L), len(L))
+            yield nose.tools.eq_, nd.shape, tuple(map(len, rs))
+            yield nose.tools.eq_, list(nd), L
+            yield nose.tools.eq_, [nd[i] for i in range(-len(L), len(L))], L + L
+            yield nose.tools.eq_, [nd.index(c) for c in L], list(range(len(L)))
+            yield nose.tools.ok_, all([c in nd for c in L])
+            yield nose.tools.eq_, [list(nd.iterator(i)) for i in range(-2, 3)], \
+                  [L[i:] for i in range(-2, 3)]
+            for s in _get_slices()[:20]:
+                yield nose.tools.eq_, list(nd[s]), L[s], s
+            yield (nose.tools.eq_, [list(c) for c in nd.chunks(4)],
+                   [L[i:i + 4] for i in range(0, len(L), 4)])
+            yield nose.tools.eq_, sum([list(p) for p in nd.split(3)], []), L
+            yield nose.tools.eq_, [list(nd.shard(i, 3)) for i in range(3)], \
+                  [L[i::3] for i in range(3)]
+            yield nose.tools.eq_, pickle.loads(pickle.dumps(nd)), nd
+            yield nose.tools.assert_raises, IndexError, nd.__getitem__, len(L)
+            yield nose.tools.eq_, eval(repr(nd)), nd
+            yield nose.tools.eq_, hash(eval(repr(nd))), hash(nd)
+            yield nose.tools.eq_, bool(nd), bool(L)
+    nd = ndrange(lrange(BIGINT), lrange(-3, 3, 2), lrange(BIGINT, 0, -BIGINT // 7))
+    n = BIGINT * 3 * 7
+    yield nose.tools.eq_, nd.length, n
+    yield nose.tools.assert_raises, OverflowError, len, nd
+    for i in [0, 1, 20, 21, n // 2, n - 1]:
+        yield nose.tools.eq_, nd.index(nd[i]), i
+    yield nose.tools.eq_, nd[-1], (BIGINT - 1, 1, nd.ranges[2][-1])
+    yield nose.tools.eq_, list(nd.iterator(-3)), [nd[-3], nd[-2], nd[-1]]
+    yield nose.tools.ok_, (BIGINT - 1, -1, BIGINT) in nd
+    yield nose.tools.ok_, (BIGINT, -1, BIGINT) not in nd
+    yield nose.tools.ok_, [0, -1, BIGINT] not in nd
+    yield nose.tools.assert_raises, ValueError, nd.index, (0, 0, BIGINT)
+    sub = nd[::BIGINT // 2, 1:]
+    yield nose.tools.eq_, sub, ndrange(lrange(0, BIGINT, BIGINT // 2),
+                                       lrange(-1, 3, 2), nd.ranges[2])
+    yield nose.tools.eq_, sub.shape, (2, 2, 7)
+    yield nose.tools.assert_raises, TypeError, nd.__getitem__, (0, 1)
+    yield nose.tools.assert_raises, IndexError, nd.__getitem__, (slice(1),) * 4
+    yield nose.tools.assert_raises, TypeError, ndrange, 3
+    yield nose.tools.eq_, list(ndrange()), [()]
+    yield nose.tools.eq_, ndrange(lrange(0), lrange(3)), ndrange(lrange(2),
+                                                                 lrange(0))
+    empty = ndrange(lrange(0), lrange(3)), ndrange(lrange(2), lrange(0))
+    yield nose.tools.eq_, hash(empty[0]), hash(empty[1])
+    yield nose.tools.ok_, not empty[0] != empty[1]
+    yield nose.tools.ok_, ndrange(lrange(2)) != ndrange(lrange(3))
+    yield nose.tools.ok_, ndrange(lrange(2)) != ndrange(lrange(2), lrange(1))
+    yield nose.tools.ok_, ndrange(lrange(3)) != lrange(3)
+    yield nose.tools.ok_, not ndrange(lrange(3)) == lrange(3)
+
+
+def test_frange():
+    from decimal import Decimal
+    for args in _get_short_lranges_args():
+        if len(args) == 1:
+            args = [0] + args
+        args = (args + [1])[:3]
+        ir = lrange(*args)
+        for scale in [Fraction(1, 3), Fraction(7, 4), Decimal('0.25')]:
+            fr = frange(*[a * scale for a in args])
+            L = [i * scale for i in ir]
+            yield nose.tools.eq_, list(fr), L
+            yield nose.tools.eq_, (len(fr), fr.length), (len(ir), ir.length)
+            yield nose.tools.eq_, [fr[i] for i in range(-len(L), len(L))], L + L
+            yield nose.tools.eq_, [fr.index(x) for x in L], list(range(len(L)))
+            yield nose.tools.ok_, all([x in fr for x in L])
+            yield nose.tools.eq_, list(reversed(fr)), L[::-1]
+            for s in _get_slices()[:20]:
+                yield nose.tools.eq_, list(fr[s]), L[s], s
+            yield (nose.tools.eq_, [list(c) for c in fr.chunks(7)],
+                   list(fr.chunks(7, 'list')))
+            yield (nose.tools.eq_, [list(p) for p in fr.split(3)],
+                   [[i * scale for i in p] for p in ir.split(3)])
+            yield nose.tools.eq_, list(fr.shard(1, 3)), L[1::3]
+            yield nose.tools.eq_, fr.sum(), ir.sum() * scale
+            yield nose.tools.eq_, pickle.loads(pickle.dumps(fr)), fr
+            yield nose.tools.eq_, eval(repr(fr)), fr
+            yield nose.tools.ok_, not fr != eval(repr(fr))
+            yield nose.tools.eq_, bool(fr), bool(L)
+            yield nose.tools.eq_, [fr.count(x) for x in L], [1] * len(L)
+            yield nose.tools.eq_, fr.count(scale / 2), L.count(scale / 2)
+            if scale / 2 not in L:
+                yield nose.tools.assert_raises, ValueError, fr.index, scale / 2
+            if not L:
+                yield nose.tools.assert_raises, ValueError, fr.min
+                continue
+            yield nose.tools.eq_, (fr.min(), fr.max()), (min(L), max(L))
+            if isinstance(scale, Fraction): # lrange stats are Fractions
+                for stat in ['mean', 'median', 'pvariance']:
+                    yield (nose.tools.eq_, getattr(fr, stat)(),
+                           getattr(ir, stat)() * scale**(1 + (stat[0] == 'p')))
+                yield nose.tools.eq_, fr.quantile(0.3), ir.quantile(0.3) * scale
+                if len(L) > 1:
+                    yield nose.tools.eq_, fr.variance(), ir.variance() * scale**2
+
+    r = frange(0, 1, Decimal('0.1'))
+    yield nose.tools.eq_, list(r), [Decimal(i) / 10 for i in range(10)]
+    yield nose.tools.eq_, r.sum(), Decimal('4.5')
+    yield nose.tools.ok_, Decimal('0.70') in r
+    yield nose.tools.ok_, 0.5 in r # finite floats are exact binary fractions
+    yield nose.tools.ok_, 0.1 not in r
+    yield nose.tools.ok_, 'a' not in r and float('nan') not in r
+    r = frange(Fraction(1, 3), BIGINT, Fraction(1, 3))
+    yield nose.tools.eq_, r.length, 3 * BIGINT - 1
+    yield nose.tools.eq_, r[-1], BIGINT - Fraction(1, 3)
+    yield nose.tools.eq_, r.index(BIGINT - 1), 3 * BIGINT - 4
+    yield nose.tools.assert_raises, OverflowError, len, r
+    yield nose.tools.assert_raises, TypeError, frange, 0.5
+    yield (nose.tools.assert_raises, TypeError, frange, Decimal(1),
+           Fraction(1, 2))
+    yield nose.tools.assert_raises, ValueError, frange, 0, 1, Fraction(0)
+    yield nose.tools.assert_raises, ValueError, frange, Decimal('inf')
+    yield nose.tools.eq_, frange(0), frange(5, 1)
+    yield nose.tools.eq_, hash(frange(Fraction(3), 4, 7)), hash(frange(3, 4))
+    yield nose.tools.ok_, frange(3) != frange(4) and frange(3) != lrange(3)
+    yield nose.tools.ok_, not frange(3) == lrange(3)
+    yield nose.tools.eq_, frange(0, 3, Decimal(1)).pvariance(), \
+          Decimal(2) / Decimal(3) # 2/3 has no finite decimal expansion
+    yield nose.tools.ok_, complex(1, 0) in frange(3)
+    yield nose.tools.ok_, complex(1, 1) not in frange(3)
+    for args in [(), (1, 2, 3, 4)]:
+        yield (nose.tools.assert_raises, TypeError, frange) + args
+    for q in [-1, Fraction(3, 2)]:
+        yield nose.tools.assert_raises, ValueError, frange(3).quantile, q
+    yield (nose.tools.assert_raises, ValueError, list,
+           frange(3).chunks(2, 'numpy'))
+    empty = frange(0)
+    yield nose.tools.assert_raises, ValueError, empty.max
+    for stat in ['mean', 'median', 'pvariance', 'variance']:
+        yield nose.tools.assert_raises, ValueError, getattr(empty, stat)
+    yield nose.tools.assert_raises, ValueError, frange(1).variance
+    yield nose.tools.assert_raises, ValueError, empty.quantile, 0.5
+
+
+def _square(x):
+    return x * x
+
+
+def _fail_at_77(x):
+    if x == 77:
+        raise ValueError(x)
+    return x
+
+
+def test_parallel():
+    import operator
+    import threading
+    for args, chunk in [((0,), None), ((1,), 1), ((3, 1000, 7), 10),
+                        ((BIGINT, BIGINT - 500, -3), None)]:
+        ir = lrange(*args)
+        L = [x * x for x in ir]
+        yield (nose.tools.eq_, list(ir.parallel_map(_square, 3, chunk,
+                                                    threads=True)), L)
+        yield (nose.tools.eq_, sorted(ir.parallel_map(
+            _square, 3, chunk, ordered=False, threads=True)), sorted(L))
+        yield (nose.tools.eq_, ir.parallel_reduce(
+            operator.add, operator.add, 0, 3, chunk, threads=True), ir.sum())
+        # non-commutative combine: blocks are combined in order
+        yield (nose.tools.eq_, ir.parallel_reduce(
+            lambda acc, x: acc + [x], operator.add, [], 2, 7, threads=True),
+               list(ir))
+    ir = lrange(5000)
+    yield nose.tools.eq_, list(ir.parallel_map(_square, 2)), [x * x for x in ir]
+    yield (nose.tools.eq_, ir.parallel_reduce(operator.add, operator.add, 0, 2),
+           ir.sum())
+    for threads in [False, True]:
+        for ordered in [False, True]:
+            g = ir.parallel_map(_fail_at_77, 2, 10, ordered, threads)
+            yield nose.tools.assert_raises, ValueError, list, g
+    # bounded number of blocks in flight
+    lock = threading.Lock()
+    calls = []
+    def record(x):
+        lock.acquire()
+        calls.append(x)
+        lock.release()
+        return x
+    g = lrange(10**9).parallel_map(record, 2, 1, threads=True, max_pending=2)
+    yield nose.tools.eq_, next(g), 0
+    yield nose.tools.ok_, len(calls) <= 2
+    g.close()
+    yield (nose.tools.assert_raises, Exception, list,
+           ir.parallel_map(lambda x: x, 2)) # can't pickle lambda
+    yield nose.tools.assert_raises, ValueError, ir.parallel_map, _square, 0
+    # workers default to cpu_count() or 1 if it is unknown
+    L = [x * x for x in lrange(100)]
+    yield (nose.tools.eq_, list(lrange(100).parallel_map(_square,
+                                                         threads=True)), L)
+    import multiprocessing
+    def unknown():
+        raise NotImplementedError
+    cpu_count = multiprocessing.cpu_count
+    multiprocessing.cpu_count = unknown
+    try:
+        result = list(lrange(100).parallel_map(_square, threads=True))
+    finally:
+        multiprocessing.cpu_count = cpu_count
+    yield nose.tools.eq_, result, L
+
+
 class TestBIGINT(unittest.TestCase):
 
     def setUp(self):
@@ -415,3 +1731,4 @@ class TestBIGINT(unittest.TestCase):
 if __name__ == "__main__":
     import nose
     sys.exit(nose.main())
+